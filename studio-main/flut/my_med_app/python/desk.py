@@ -7,27 +7,64 @@ Behavior:
  - "Start Import" button: confirms deletion of top-level collections, deletes them, then uploads
  - MARG -> medicine-1: only uploads Product Name, Current Stock, M.R.P., EXP
  - PMBI -> medicine-2: only uploads Drug Code, Drug Name, UOM, Batch No, Expiry Date, Qty, MRP
- - Header names are normalized (strip, lowercase, remove punctuation) and auto-mapped
+ - Header names are fuzzy-matched to fields (header_match.py); confirmed layouts are remembered per header signature
  - Dates are stored as Python datetime objects (Admin SDK converts to Firestore timestamp)
  - Batched writes (<= 400)
- - Logs shown in GUI
- - Requires: firebase-admin, pandas, openpyxl
+ - Parsed items are kept in a column RecordStore; dicts are only built for Firestore writes
+ - Data-quality report (bad MRP/expiry, negative stock, duplicate ids) saved as <excel>.quality.json
+ - Each import is kept as a versioned Arrow snapshot (snapshots.py, needs pyarrow; last 5 kept)
+ - Multi-sheet workbooks: each sheet with a recognizable header is a store, parsed in parallel worker processes;
+   items get store_id and ids are prefixed with it
+ - Logs shown in GUI, with a throttled progress bar (rows, stage, ETA) and a Cancel button (progress.py)
+ - Requires: firebase-admin, pandas, openpyxl, numpy
+
+Not a standalone script: the parsing pipeline (records.py, quality.py,
+header_match.py, snapshots.py, workbook.py, progress.py) is shared with the
+desktop app's bundled process_excel.py and lives in
+studio-main/med_sync_desktop/assets/scripts. desk.py finds it relative to its
+own location in this repository; set MED_SYNC_SCRIPTS_DIR to use a copy
+elsewhere.
 """
 import tkinter as tk
-from tkinter import filedialog, messagebox, scrolledtext
-import threading, time, traceback, re, math
+from tkinter import filedialog, messagebox, scrolledtext, ttk
+import threading, time, traceback, re, math, os, sys
 from datetime import datetime
 
 import pandas as pd
 import firebase_admin
 from firebase_admin import credentials, firestore
+from google.api_core import exceptions as gexc
+
+SCRIPTS_DIR = os.environ.get("MED_SYNC_SCRIPTS_DIR") or os.path.normpath(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "med_sync_desktop", "assets", "scripts"))
+if not os.path.isfile(os.path.join(SCRIPTS_DIR, "records.py")):
+    sys.exit(f"desk.py: shared pipeline modules not found in {SCRIPTS_DIR}\n"
+             "Run it from the studio-main checkout or set MED_SYNC_SCRIPTS_DIR to med_sync_desktop/assets/scripts.")
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+from records import RecordStore, FLOAT, INT, DATE, TEXT
+import quality
+import header_match
+import snapshots
+import workbook
+import progress as progress_mod
 
 # ---------------------------
 # GUI logging helper
 # ---------------------------
+root = None  # set by build_gui(); without a window (tests, scripts) logs go to stdout
+log_box = None
+ent_sa = ent_marg = ent_pmbi = None
+status_var = progress_bar = None
+current_import = None  # Progress of the running import, cancelled by the Cancel button
+
 def gui_log(msg: str):
     ts = datetime.now().strftime("%H:%M:%S")
     line = f"{ts} - {msg}"
+    if root is None:
+        print(line)
+        return
     def _append():
         log_box.configure(state="normal")
         log_box.insert(tk.END, line + "\n")
@@ -35,6 +72,17 @@ def gui_log(msg: str):
         log_box.configure(state="disabled")
     root.after(1, _append)
 
+def gui_progress(update):
+    """Progress sink: status line and bar (already throttled by progress.Progress)."""
+    text = progress_mod.format_update(update)
+    if root is None:
+        print(text)
+        return
+    def _show():
+        status_var.set(text)
+        progress_bar["value"] = 100 * update["done"] / update["total"] if update["total"] else 0
+    root.after(0, _show)
+
 # ---------------------------
 # Utilities
 # ---------------------------
@@ -46,7 +94,8 @@ def sanitize_doc_id(s: str) -> str:
 
 def parse_number(v):
     if v is None: return None
-    if isinstance(v, (int, float)) and not (isinstance(v, float) and math.isnan(v)):
+    if isinstance(v, float) and math.isnan(v): return None
+    if isinstance(v, (int, float)):
         return float(v)
     s = str(v).strip().replace(",", "")
     if s == "": return None
@@ -80,14 +129,6 @@ def parse_date(v):
     except:
         return None
 
-def normalize_header_key(h):
-    """Normalize header: lowercase, strip, remove non-alnum (but keep letters/numbers)."""
-    if h is None: return ""
-    s = str(h).strip().lower()
-    # replace common separators with nothing
-    s = re.sub(r"[^\w]", "", s)  # removes spaces, dots, slashes, hyphens
-    return s
-
 def row_summary(row, limit=4):
     pairs = []
     for k, v in row.items():
@@ -131,184 +172,156 @@ def delete_all_collections(db):
 # ---------------------------
 # Excel reading + header detection
 # ---------------------------
-def read_excel_rows(path):
+def read_excel_sheets(path, file_type, fields=None, progress=None):
+    """
+    Read every sheet of a workbook that has a recognizable header (header_match.py).
+    Sheets are read in worker processes, so Cancel also stops a long read.
+    Returns [(sheet name, rows, columns)].
+    A single-sheet workbook falls back to its first row when no header is found.
+    """
     try:
-        df = pd.read_excel(path, dtype=object, header=0)
+        sheets = workbook.sheet_names(path)
+        frames = workbook.map_sheets(workbook.read_sheet_frame, path, sheets, file_type, fields, len(sheets) == 1, object,
+                                     progress=progress, isolate=progress is not None)
+    except progress_mod.Cancelled:
+        raise
     except Exception as e:
         gui_log(f"Error reading '{path}': {e}")
         raise
 
-    cols = list(df.columns)
-    # attempt to detect header if Unnamed...
-    if any(str(c).startswith("Unnamed") or re.fullmatch(r"\d+", str(c)) for c in cols[:6]):
-        raw = pd.read_excel(path, dtype=object, header=None)
-        def looks_like_header(row):
-            letters = sum(1 for x in row if isinstance(x, str) and re.search(r"[A-Za-z]", x))
-            return letters >= max(1, len(row)//5)
-        header_idx = None
-        for i in range(min(6, len(raw))):
-            if looks_like_header(raw.iloc[i].tolist()):
-                header_idx = i
-                break
-        if header_idx is not None:
-            df = pd.read_excel(path, dtype=object, header=header_idx)
-            gui_log(f"Auto-detected header row {header_idx} for '{path}'")
-        else:
-            gui_log(f"Using first row as header for '{path}'")
-
-    df = df.where(pd.notnull(df), None)
-    rows = df.to_dict(orient="records")
-    detected_cols = [str(c) for c in df.columns]
-    gui_log(f"Detected columns for '{path}': {detected_cols}")
-    if rows:
-        gui_log(f"Sample row -> {row_summary(rows[0])}")
-    return rows, detected_cols
+    out = []
+    for f in frames:
+        if f.df is None:
+            gui_log(f"Sheet '{f.sheet}': no header found, skipped")
+            continue
+        df = f.df.where(pd.notnull(f.df), None)
+        detected_cols = [str(c) for c in df.columns]
+        gui_log(f"Sheet '{f.sheet}': header row {f.header_row}{' (remembered layout)' if f.cached else ''}, {len(df)} rows")
+        gui_log(f"Detected columns for '{path}' [{f.sheet}]: {detected_cols}")
+        if len(df):
+            gui_log(f"Sample row -> {row_summary(df.iloc[0].to_dict())}")
+        out.append((f.sheet, DataFrameRows(df), detected_cols))
+    return out
+
+class DataFrameRows:
+    """Re-iterable view over a DataFrame; yields one transient dict per row instead of a list of dicts."""
+    __slots__ = ("df",)
+    def __init__(self, df):
+        self.df = df
+    def __len__(self):
+        return len(self.df)
+    def __iter__(self):
+        cols = list(self.df.columns)
+        for values in self.df.itertuples(index=False, name=None):
+            yield dict(zip(cols, values))
 
 # ---------------------------
-# Smart header -> canonical mapping
+# Header -> canonical mapping (header_match.py)
 # ---------------------------
-# Canonical fields for MARG and PMBI (strict)
-MARG_ALLOWED = {"Product Name", "Current Stock", "M.R.P.", "EXP"}
-PMBI_ALLOWED = {"Drug Code", "Drug Name", "UOM", "Batch No", "Expiry Date", "Qty", "MRP"}
-
-def smart_map_header(orig_header):
-    """
-    Return canonical field name if header maps to something we care about, else None.
-    Uses normalized key and keyword matching.
-    """
-    nk = normalize_header_key(orig_header)
-    # direct known mappings
-    if nk in ("productname","product","product_name","name"):
-        return "Product Name"
-    if nk in ("currentstock","current_stock","stock","quantity"):
-        return "Current Stock"
-    # MRP variations
-    if "mrp" in nk or nk in ("m.r.p","mrp.","m_r_p","price","rate"):
-        # for MARG we use "M.R.P." canonical; for PMBI canonical later will be "MRP"
-        return "M.R.P."  # we'll also accept MARG's M.R.P.; for PMBI we map to MRP later
-    # expiry/exp variations
-    if "exp" == nk or nk.startswith("exp") or "expiry" in nk or "bestbefore" in nk or "bb" == nk:
-        # ambiguous: MARG uses "EXP" canonical; PMBI uses "Expiry Date"
-        # We'll return a marker; decision later depends on target collection.
-        return "EXP_OR_EXPIRY"
-    # PMBI-specific mappings
-    if "drugcode" in nk or nk == "code":
-        return "Drug Code"
-    if "drugname" in nk or ("drug" in nk and "name" in nk):
-        return "Drug Name"
-    if nk == "uom":
-        return "UOM"
-    if "batch" in nk:
-        return "Batch No"
-    if nk in ("qty","quantity","qnty"):
-        return "Qty"
-    # last fallback: exact "mrp" handled earlier; if nk contains 'mrp' returned already
-    return None
+# Column kinds for the RecordStore of each collection (strict fields)
+MARG_SCHEMA = {"Product Name": TEXT, "Current Stock": INT, "M.R.P.": FLOAT, "EXP": DATE}
+PMBI_SCHEMA = {"Drug Code": TEXT, "Drug Name": TEXT, "UOM": TEXT, "Batch No": TEXT,
+               "Expiry Date": DATE, "Qty": INT, "MRP": FLOAT}
 
 # ---------------------------
-# Upload logic (uses smart_map_header)
+# Upload logic
 # ---------------------------
-def upload_collection_strict(db, collection_name, rows, base_candidates, write_to_firestore=False):
+SKIP_LOG_LIMIT = 5  # skipped rows logged one by one; the rest are counted in the quality report
+COMMIT_RETRIES = 5  # attempts per batch on quota/availability errors
+COMMIT_BACKOFF = 1.0  # seconds before the first retry, doubled on each attempt
+RETRYABLE_ERRORS = (gexc.ResourceExhausted, gexc.ServiceUnavailable, gexc.DeadlineExceeded)
+
+def commit_batch(batch, collection_name):
+    """Commit a write batch, retrying quota and availability errors with exponential backoff."""
+    for attempt in range(COMMIT_RETRIES):
+        try:
+            return batch.commit()
+        except RETRYABLE_ERRORS as e:
+            if attempt == COMMIT_RETRIES - 1:
+                raise
+            delay = COMMIT_BACKOFF * (2 ** attempt)
+            gui_log(f"{collection_name}: batch commit failed ({e}), retrying in {delay:.0f}s")
+            time.sleep(delay)
+
+def upload_collection_strict(db, collection_name, rows, write_to_firestore=False, skipped_rows=None, profiles=None, progress=None):
+    if progress is None:
+        progress = progress_mod.current()
     coll_ref = db.collection(collection_name)
     uploaded = 0; skipped = 0; failed = 0
     # Batch is only needed if write_to_firestore is True
     batch = db.batch(); batch_count = 0; BATCH_LIMIT = 400
-    uploaded_items = [] # Collect items for metadata
-
-    def find_base_value(row):
-        for cand in base_candidates:
-            if cand in row and row[cand] not in (None, ""):
-                return row[cand]
-        cand_norms = [normalize_header_key(c) for c in base_candidates]
-        for k, v in row.items():
-            if v in (None, ""): continue
-            if normalize_header_key(k) in cand_norms:
-                return v
-        # header containing name+product/drug
-        for k, v in row.items():
-            if v in (None, ""): continue
-            nk = normalize_header_key(k)
-            if ("name" in nk) and ("product" in nk or "drug" in nk):
-                return v
-        return None
-
-    for row in rows:
+    # Collect items for metadata (column store, dicts are built at serialization)
+    schema = MARG_SCHEMA if collection_name == "medicine-1" else PMBI_SCHEMA
+    file_type = "marg" if collection_name == "medicine-1" else "pmbi"
+    base_field = header_match.name_field(file_type)  # names the document
+    store = RecordStore(schema, id_key="id")
+    header_plans = {}  # tuple(row headers) -> ({header: canonical}, base header), resolved once per layout
+    resolved = []  # (signature, mapping) of layouts that came from scoring, remembered on success
+
+    def plan_for(row):
+        headers = tuple(row.keys())
+        plan = header_plans.get(headers)
+        if plan is None:
+            mapping, signature, cached = header_match.resolve(file_type, headers, profiles, fields=schema)
+            plan = {headers[pos]: field for field, pos in mapping.items() if pos < len(headers)}
+            base_header = next((h for h, f in plan.items() if f == base_field), None)
+            header_plans[headers] = plan = (plan, base_header)
+            gui_log(f"{collection_name} header mapping{' (remembered layout)' if cached else ''}: "
+                    + ", ".join(f"{h} -> {f}" for h, f in plan[0].items()))
+            if base_header is None:
+                gui_log(f"{collection_name}: no {base_field} column found, rows are skipped")
+            if not cached:
+                resolved.append((signature, mapping))
+        return plan
+
+    # rows are counted (and cancellation checked) every CHUNK_ROWS rows
+    for row in progress.iterate(rows):
         try:
-            base_val = find_base_value(row)
-            if base_val is None:
+            plan, base_header = plan_for(row)
+            base_val = row.get(base_header) if base_header is not None else None
+            if base_val is None or str(base_val).strip() == "":
                 skipped += 1
-                gui_log(f"Skipping row (no base): {row_summary(row)}")
+                if skipped <= SKIP_LOG_LIMIT:
+                    gui_log(f"Skipping row (no base): {row_summary(row)}")
+                if skipped_rows is not None and len(skipped_rows) < quality.SAMPLE_SIZE:
+                    skipped_rows.append(row_summary(row))
                 continue
 
             doc_id = sanitize_doc_id(base_val)
             data = {}
+            raw = {}  # values that failed to parse are kept verbatim
 
             # iterate original headers -> map to canonical if relevant
             for orig_header, val in row.items():
-                mapped = smart_map_header(orig_header)
-                if mapped is None:
+                canonical = plan.get(orig_header)
+                if canonical is None:
                     continue
 
-                # if smart_map returned "EXP_OR_EXPIRY", decide canonical per target collection
-                if mapped == "EXP_OR_EXPIRY":
-                    if collection_name == "medicine-1":
-                        canonical = "EXP"
-                    else:
-                        canonical = "Expiry Date"
-                else:
-                    # special case: smart_map returns "M.R.P." for MRPs; PMBI wants "MRP" canonical
-                    if mapped == "M.R.P." and collection_name == "medicine-2":
-                        canonical = "MRP"
-                    else:
-                        canonical = mapped
-
-                # ensure canonical is allowed for this collection
-                if collection_name == "medicine-1":
-                    if canonical not in MARG_ALLOWED:
-                        continue
-                else:
-                    if canonical not in PMBI_ALLOWED:
-                        continue
-
                 # parse values
-                if canonical in ("M.R.P.", "MRP"):
+                kind = schema[canonical]
+                if kind == FLOAT:
                     parsed = parse_number(val)
-                    data[canonical] = parsed if parsed is not None else (val if val is not None else None)
-                elif canonical in ("Current Stock", "Qty"):
+                elif kind == INT:
                     parsed = parse_int(val)
-                    data[canonical] = parsed if parsed is not None else (val if val is not None else None)
-                elif canonical in ("EXP", "Expiry Date"):
-                    parsed_date = parse_date(val)
-                    if parsed_date:
-                        data[canonical] = parsed_date
-                    else:
-                        data[canonical] = val if val is not None else None
+                elif kind == DATE:
+                    parsed = parse_date(val)
                 else:
-                    data[canonical] = val
-
-            # ensure base field exists under canonical name
-            if collection_name == "medicine-1":
-                if "Product Name" not in data:
-                    data["Product Name"] = base_val
-            else:
-                if "Drug Name" not in data:
-                    data["Drug Name"] = base_val
-
-            data["_imported_at"] = firestore.SERVER_TIMESTAMP
+                    # numeric codes (Drug Code 217) are text too; the snapshot keeps TEXT as str
+                    parsed = None if val is None else str(val)
+                if parsed is not None:
+                    data[canonical] = parsed
+                    raw.pop(canonical, None)
+                else:
+                    data.pop(canonical, None)
+                    raw[canonical] = val
 
-            # Prepare metadata item (needs explicit ID)
-            meta_item = data.copy()
-            meta_item['id'] = doc_id
-            uploaded_items.append(meta_item)
+            idx = store.append(doc_id, data, raw)
 
             if write_to_firestore:
-                batch.set(coll_ref.document(doc_id), data)
+                doc = store.item(idx, with_id=False)
+                doc["_imported_at"] = firestore.SERVER_TIMESTAMP
+                batch.set(coll_ref.document(doc_id), doc)
                 batch_count += 1
-                
-                if batch_count >= BATCH_LIMIT:
-                    batch.commit()
-                    batch = db.batch()
-                    batch_count = 0
             
             uploaded += 1
 
@@ -317,18 +330,133 @@ def upload_collection_strict(db, collection_name, rows, base_candidates, write_t
             gui_log(f"Failed writing row for base '{base_val if 'base_val' in locals() else 'unknown'}': {e}")
             traceback.print_exc()
 
+        # outside the row try: a batch that cannot be committed stops the upload
+        if write_to_firestore and batch_count >= BATCH_LIMIT:
+            commit_batch(batch, collection_name)
+            batch = db.batch()
+            batch_count = 0
+
     if write_to_firestore and batch_count > 0:
-        batch.commit()
+        commit_batch(batch, collection_name)
+
+    # a scored layout is only trusted once the upload produced items and it has a name column
+    if profiles is not None and uploaded:
+        for signature, mapping in resolved:
+            if not header_match.names_items(file_type, mapping, schema):
+                continue
+            try:
+                profiles.remember(signature, mapping)
+            except OSError as e:
+                gui_log(f"Could not save header profile: {e}")
+
+    return uploaded, skipped, failed, store
+
+def report_quality(label, source_path, results):
+    """
+    Validate the imported stores, save <excel>.quality.json and log a summary. Returns the summary lines.
+    results: [(store label, store, skipped, skipped_rows)]; several stores are reported under "stores".
+    """
+    reports = {}
+    for store_label, store, skipped, skipped_rows in results:
+        reports[store_label] = quality.validate(store, skipped_rows=skipped_rows, skipped=skipped)
+    report = next(iter(reports.values())) if len(reports) == 1 else {"stores": reports}
+    report["source"] = source_path
+    try:
+        path = quality.write_report(report, quality.report_path(source_path))
+        gui_log(f"{label} quality report written: {path}")
+    except OSError as e:
+        gui_log(f"Could not write {label} quality report: {e}")
+    lines = []
+    for store_label, r in reports.items():
+        lines += quality.summary_lines(r, store_label)
+    for line in lines:
+        gui_log(line)
+    return lines
+
+def save_snapshot(label, file_type, source_path, store):
+    """Write the import as a local columnar snapshot; a failure here does not stop the import."""
+    if not snapshots.available():
+        gui_log(f"{label} snapshot skipped (pyarrow not installed)")
+        return None
+    try:
+        path = snapshots.write_snapshot(store, file_type, source=source_path)
+    except Exception as e:  # disk, pyarrow (ArrowInvalid) or an unsaveable formatter
+        gui_log(f"Could not write {label} snapshot: {e}")
+        return None
+    gui_log(f"{label} snapshot written: {path}")
+    return path
 
-    return uploaded, skipped, failed, uploaded_items
+def import_collection(db, label, path, collection_name, file_type, meta_doc, profiles, progress=None):
+    """
+    Read all sheets of one Excel file, build the items and update metadata/<meta_doc>. Returns quality summary lines.
+    Raises progress_mod.Cancelled when progress is cancelled; metadata is then left untouched.
+    """
+    if progress is None:
+        progress = progress_mod.current()
+    schema = MARG_SCHEMA if file_type == "marg" else PMBI_SCHEMA
+    gui_log(f"Reading {label}: {path}")
+    progress.start(f"{label} read")
+    sheets = read_excel_sheets(path, file_type, set(schema), progress)
+    multi_store = len(sheets) > 1
+    if multi_store:
+        gui_log(f"{label}: {len(sheets)} store sheets: {[name for name, _, _ in sheets]}")
+    gui_log(f"Uploading {label} -> {collection_name} ({', '.join(schema)})...")
+
+    store_ids = workbook.store_ids(name for name, _, _ in sheets)
+    results = []
+    for (sheet_name, rows, cols), store_id in zip(sheets, store_ids):
+        sheet_label = f"{label}/{store_id}" if multi_store else label
+        # write_to_firestore=False to save writes
+        skipped_rows = []
+        progress.start(f"{sheet_label} parse", len(rows))
+        up, sk, fl, store = upload_collection_strict(db, collection_name, rows, write_to_firestore=False, skipped_rows=skipped_rows, profiles=profiles, progress=progress)
+        gui_log(f"{sheet_label} summary: processed={up}, skipped={sk}, failed={fl}")
+        if not len(store):
+            continue
+        snapshot_type = file_type
+        if multi_store:
+            # tag items with their store and keep ids apart across branches
+            store.constants["store_id"] = store_id
+            store.prefix_ids(store_id + "__")
+            snapshot_type = f"{file_type}-{store_id}"
+        save_snapshot(sheet_label, snapshot_type, path, store)
+        results.append((sheet_label, store, sk, skipped_rows))
+
+    if not results:
+        return []
+    quality_lines = report_quality(label, path, results)
+    stores = [r[1] for r in results]
+    total = sum(len(s) for s in stores)
+    progress.start(f"{label} publish", total)  # last chance to cancel before metadata is overwritten
+    if total:
+        gui_log(f"Updating metadata/{meta_doc} with {total} items...")
+        items = [item for store in stores for item in store.iter_items()]
+        # one import time for the document: Firestore rejects SERVER_TIMESTAMP inside the items array
+        db.collection('metadata').document(meta_doc).set({'items': items, '_imported_at': firestore.SERVER_TIMESTAMP})
+        gui_log(f"metadata/{meta_doc} updated.")
+    progress.advance(total)
+    progress.finish()
+    return quality_lines
 
 # ---------------------------
 # Worker thread
 # ---------------------------
 def start_import_thread():
-    threading.Thread(target=run_import, daemon=True).start()
+    global current_import
+    if current_import is not None:
+        gui_log("An import is already running.")
+        return
+    current_import = progress_mod.Progress(sink=gui_progress)
+    threading.Thread(target=run_import, args=(current_import,), daemon=True).start()
 
-def run_import():
+def cancel_import():
+    if current_import is None:
+        return
+    current_import.cancel()
+    gui_log("Cancelling import...")
+
+def run_import(progress):
+    global current_import
     try:
         sa_path = ent_sa.get().strip()
         marg_path = ent_marg.get().strip()
@@ -354,92 +482,90 @@ def run_import():
             return
 
         delete_all_collections(db)
+        quality_lines = []
+        profiles = header_match.ProfileStore()
 
         if marg_path:
-            gui_log(f"Reading MARG: {marg_path}")
-            rows_marg, cols_marg = read_excel_rows(marg_path)
-            gui_log(f"MARG raw headers: {cols_marg}")
-            base_candidates_marg = ["Product Name", "ProductName", "product name", "Product", "name"]
-            gui_log("Uploading MARG -> medicine-1 (Product Name, Current Stock, M.R.P., EXP)...")
-            # write_to_firestore=False to save writes
-            up, sk, fl, items1 = upload_collection_strict(db, "medicine-1", rows_marg, base_candidates_marg, write_to_firestore=False)
-            gui_log(f"MARG summary: processed={up}, skipped={sk}, failed={fl}")
-            
-            if items1:
-                gui_log(f"Updating metadata/medicine_1_data with {len(items1)} items...")
-                db.collection('metadata').document('medicine_1_data').set({'items': items1})
-                gui_log("metadata/medicine_1_data updated.")
+            quality_lines += import_collection(db, "MARG", marg_path, "medicine-1", "marg", "medicine_1_data", profiles, progress)
 
         if pmbi_path:
-            gui_log(f"Reading PMBI: {pmbi_path}")
-            rows_pmbi, cols_pmbi = read_excel_rows(pmbi_path)
-            gui_log(f"PMBI raw headers: {cols_pmbi}")
-            base_candidates_pmbi = ["Drug Name", "DrugName", "drug name", "Drug", "name"]
-            gui_log("Uploading PMBI -> medicine-2 (Drug Code, Drug Name, UOM, Batch No, Expiry Date, Qty, MRP)...")
-            # write_to_firestore=False to save writes
-            up2, sk2, fl2, items2 = upload_collection_strict(db, "medicine-2", rows_pmbi, base_candidates_pmbi, write_to_firestore=False)
-            gui_log(f"PMBI summary: processed={up2}, skipped={sk2}, failed={fl2}")
-
-            if items2:
-                gui_log(f"Updating metadata/medicine_2_data with {len(items2)} items...")
-                db.collection('metadata').document('medicine_2_data').set({'items': items2})
-                gui_log("metadata/medicine_2_data updated.")
+            quality_lines += import_collection(db, "PMBI", pmbi_path, "medicine-2", "pmbi", "medicine_2_data", profiles, progress)
 
         gui_log("=== IMPORT FINISHED ===")
-        messagebox.showinfo("Done", "Import finished. See log for details.")
+        messagebox.showinfo("Done", "Import finished. See log for details.\n\n" + "\n".join(quality_lines))
+
+    except progress_mod.Cancelled:
+        gui_log("=== IMPORT CANCELLED === (metadata documents already updated above are kept)")
+        messagebox.showinfo("Cancelled", "Import cancelled. See log for details.")
 
     except Exception as e:
         gui_log(f"Unhandled error: {e}")
         traceback.print_exc()
         messagebox.showerror("Unhandled error", str(e))
 
+    finally:
+        current_import = None
+
 # ---------------------------
 # GUI layout
 # ---------------------------
-root = tk.Tk()
-root.title("Firestore Dual Importer — smart header mapping")
-root.geometry("980x660")
-
-frame = tk.Frame(root)
-frame.pack(fill="both", expand=True, padx=12, pady=10)
-
-# Service account
-tk.Label(frame, text="Service Account JSON:").grid(row=0, column=0, sticky="w")
-ent_sa = tk.Entry(frame, width=88)
-ent_sa.grid(row=0, column=1, sticky="w")
-def browse_sa():
-    p = filedialog.askopenfilename(title="Select serviceAccount.json", filetypes=[("JSON","*.json")])
-    if p: ent_sa.delete(0, tk.END); ent_sa.insert(0, p)
-tk.Button(frame, text="Browse", width=14, command=browse_sa).grid(row=0, column=2, padx=6)
-
-# MARG
-tk.Label(frame, text="MARG Excel (Product Name base):").grid(row=1, column=0, sticky="w", pady=6)
-ent_marg = tk.Entry(frame, width=88)
-ent_marg.grid(row=1, column=1, sticky="w")
-def browse_marg():
-    p = filedialog.askopenfilename(title="Select MARG Excel", filetypes=[("Excel","*.xlsx;*.xls")])
-    if p: ent_marg.delete(0, tk.END); ent_marg.insert(0, p)
-tk.Button(frame, text="Browse", width=14, command=browse_marg).grid(row=1, column=2, padx=6)
-
-# PMBI
-tk.Label(frame, text="PMBI Excel (Drug Name base):").grid(row=2, column=0, sticky="w")
-ent_pmbi = tk.Entry(frame, width=88)
-ent_pmbi.grid(row=2, column=1, sticky="w")
-def browse_pmbi():
-    p = filedialog.askopenfilename(title="Select PMBI Excel", filetypes=[("Excel","*.xlsx;*.xls")])
-    if p: ent_pmbi.delete(0, tk.END); ent_pmbi.insert(0, p)
-tk.Button(frame, text="Browse", width=14, command=browse_pmbi).grid(row=2, column=2, padx=6)
-
-# Buttons
-btn_frame = tk.Frame(frame)
-btn_frame.grid(row=3, column=1, pady=10, sticky="w")
-tk.Button(btn_frame, text="Start Import (Delete ALL then Upload)", bg="#1976D2", fg="white", width=36, command=start_import_thread).grid(row=0, column=0, padx=6)
-tk.Button(btn_frame, text="Clear Log", width=12, command=lambda: log_box.configure(state="normal") or log_box.delete(1.0, tk.END) or log_box.configure(state="disabled")).grid(row=0, column=1, padx=6)
-
-# Log box
-log_box = scrolledtext.ScrolledText(frame, width=118, height=30, state="disabled")
-log_box.grid(row=4, column=0, columnspan=3, pady=(6,0))
-
-tk.Label(frame, text="Note: MARG fields uploaded: Product Name, Current Stock, M.R.P., EXP. PMBI fields uploaded: Drug Code, Drug Name, UOM, Batch No, Expiry Date, Qty, MRP.").grid(row=5, column=0, columnspan=3, sticky="w", pady=(8,0))
-
-root.mainloop()
+def build_gui():
+    global root, log_box, ent_sa, ent_marg, ent_pmbi, status_var, progress_bar
+    root = tk.Tk()
+    root.title("Firestore Dual Importer — smart header mapping")
+    root.geometry("980x660")
+
+    frame = tk.Frame(root)
+    frame.pack(fill="both", expand=True, padx=12, pady=10)
+
+    # Service account
+    tk.Label(frame, text="Service Account JSON:").grid(row=0, column=0, sticky="w")
+    ent_sa = tk.Entry(frame, width=88)
+    ent_sa.grid(row=0, column=1, sticky="w")
+    def browse_sa():
+        p = filedialog.askopenfilename(title="Select serviceAccount.json", filetypes=[("JSON","*.json")])
+        if p: ent_sa.delete(0, tk.END); ent_sa.insert(0, p)
+    tk.Button(frame, text="Browse", width=14, command=browse_sa).grid(row=0, column=2, padx=6)
+
+    # MARG
+    tk.Label(frame, text="MARG Excel (Product Name base):").grid(row=1, column=0, sticky="w", pady=6)
+    ent_marg = tk.Entry(frame, width=88)
+    ent_marg.grid(row=1, column=1, sticky="w")
+    def browse_marg():
+        p = filedialog.askopenfilename(title="Select MARG Excel", filetypes=[("Excel","*.xlsx;*.xls")])
+        if p: ent_marg.delete(0, tk.END); ent_marg.insert(0, p)
+    tk.Button(frame, text="Browse", width=14, command=browse_marg).grid(row=1, column=2, padx=6)
+
+    # PMBI
+    tk.Label(frame, text="PMBI Excel (Drug Name base):").grid(row=2, column=0, sticky="w")
+    ent_pmbi = tk.Entry(frame, width=88)
+    ent_pmbi.grid(row=2, column=1, sticky="w")
+    def browse_pmbi():
+        p = filedialog.askopenfilename(title="Select PMBI Excel", filetypes=[("Excel","*.xlsx;*.xls")])
+        if p: ent_pmbi.delete(0, tk.END); ent_pmbi.insert(0, p)
+    tk.Button(frame, text="Browse", width=14, command=browse_pmbi).grid(row=2, column=2, padx=6)
+
+    # Buttons
+    btn_frame = tk.Frame(frame)
+    btn_frame.grid(row=3, column=1, pady=10, sticky="w")
+    tk.Button(btn_frame, text="Start Import (Delete ALL then Upload)", bg="#1976D2", fg="white", width=36, command=start_import_thread).grid(row=0, column=0, padx=6)
+    tk.Button(btn_frame, text="Cancel", width=12, command=cancel_import).grid(row=0, column=1, padx=6)
+    tk.Button(btn_frame, text="Clear Log", width=12, command=lambda: log_box.configure(state="normal") or log_box.delete(1.0, tk.END) or log_box.configure(state="disabled")).grid(row=0, column=2, padx=6)
+
+    # Progress
+    status_var = tk.StringVar(value="Idle")
+    prog_frame = tk.Frame(frame)
+    prog_frame.grid(row=4, column=0, columnspan=3, sticky="w")
+    progress_bar = ttk.Progressbar(prog_frame, length=320, maximum=100)
+    progress_bar.grid(row=0, column=0)
+    tk.Label(prog_frame, textvariable=status_var, anchor="w").grid(row=0, column=1, padx=8, sticky="w")
+
+    # Log box
+    log_box = scrolledtext.ScrolledText(frame, width=118, height=30, state="disabled")
+    log_box.grid(row=5, column=0, columnspan=3, pady=(6,0))
+
+    tk.Label(frame, text="Note: MARG fields uploaded: Product Name, Current Stock, M.R.P., EXP. PMBI fields uploaded: Drug Code, Drug Name, UOM, Batch No, Expiry Date, Qty, MRP.").grid(row=6, column=0, columnspan=3, sticky="w", pady=(8,0))
+
+if __name__ == "__main__":
+    build_gui()
+    root.mainloop()
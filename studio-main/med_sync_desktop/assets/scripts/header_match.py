@@ -0,0 +1,211 @@
+"""
+header_match.py - map Excel column headers to canonical item fields
+
+Headers are split into lowercase alphanumeric tokens ("Exp.Dt" -> exp, dt) and
+scored against a list of aliases per field: exact token match scores 1.0,
+otherwise the best of token Jaccard and difflib ratio on the joined tokens.
+Columns and fields are then paired greedily by score, so "Product Name_kn"
+goes to the Kannada field and "Rate" only becomes M.R.P. when no better MRP
+column exists.
+
+Confirmed mappings are remembered per header signature (file type, wanted
+fields and the normalized header row) in a small JSON profile store, so a
+repeat export with a known layout is resolved without scoring.
+"""
+import hashlib
+import json
+import os
+import re
+from difflib import SequenceMatcher
+
+MATCH_THRESHOLD = 0.8
+
+# Canonical fields per file type, in output order, with aliases (best first)
+TARGETS = {
+    'marg': {
+        'Product Name': ['product name', 'item name', 'name', 'product', 'item description', 'description'],
+        'Product Name_kn': ['product name kn', 'product name kan'],
+        'Current Stock': ['current stock', 'stock', 'closing stock', 'qty', 'quantity'],
+        'M.R.P.': ['mrp', 'rate', 'price'],
+        'EXP': ['exp', 'expiry', 'expiry date', 'exp date', 'exp dt', 'best before', 'bb'],
+    },
+    'pmbi': {
+        'Drug Name': ['drug name', 'item description', 'drug'],
+        'Drug Name_kn': ['drug name kn', 'drug name kan'],
+        'Drug Code': ['drug code', 'code', 'item code'],
+        'MRP': ['mrp', 'price'],
+        'Expiry Date': ['expiry date', 'expiry', 'exp', 'exp date', 'exp dt', 'best before'],
+        'Qty': ['qty', 'quantity', 'qnty', 'stock', 'current stock'],
+        'UOM': ['uom', 'unit'],
+        'Batch No': ['batch no', 'batch', 'batch number'],
+    },
+}
+
+# The field that names an item; a header row without it is not that file type
+# (a MARG export has Code/Unit/Batch/EXP columns a PMBI report also has)
+NAME_FIELDS = {'marg': 'Product Name', 'pmbi': 'Drug Name'}
+
+# Part of every header signature; bumped when matching rules change so layouts
+# remembered under the old rules are resolved again
+SIGNATURE_VERSION = 2
+
+DEFAULT_PROFILE_PATH = os.path.join(os.path.expanduser('~'), '.med_sync', 'header_profiles.json')
+
+
+def header_tokens(h):
+    """Lowercase alphanumeric tokens of a header; blank/NaN/pandas 'Unnamed: n' give []."""
+    if h is None:
+        return []
+    s = str(h).strip().lower()
+    if s in ('', 'nan', 'none') or s.startswith('unnamed:'):
+        return []
+    return re.findall(r'[a-z0-9]+', s)
+
+
+def similarity(tokens, alias_tokens):
+    if not tokens or not alias_tokens:
+        return 0.0
+    compact, alias_compact = ''.join(tokens), ''.join(alias_tokens)
+    if compact == alias_compact:
+        return 1.0
+    a, b = set(tokens), set(alias_tokens)
+    jaccard = len(a & b) / len(a | b)
+    sm = SequenceMatcher(None, compact, alias_compact)
+    if sm.real_quick_ratio() <= jaccard:
+        return jaccard
+    return max(jaccard, sm.ratio())
+
+
+class HeaderMatcher:
+    """Scores headers against the aliases of a set of canonical fields."""
+
+    def __init__(self, targets, threshold=MATCH_THRESHOLD):
+        self.threshold = threshold
+        self.fields = list(targets)
+        self._aliases = {f: [header_tokens(a) for a in aliases] for f, aliases in targets.items()}
+
+    def score(self, header, field):
+        tokens = header_tokens(header)
+        best = 0.0
+        for rank, alias in enumerate(self._aliases[field]):
+            # later aliases lose ties against earlier ones ("M.R.P." beats "Rate")
+            best = max(best, similarity(tokens, alias) - 0.001 * rank)
+        return best
+
+    def match(self, headers):
+        """Return {field: column index} for the headers that clear the threshold."""
+        candidates = []
+        for idx, h in enumerate(headers):
+            if not header_tokens(h):
+                continue
+            for field in self.fields:
+                s = self.score(h, field)
+                if s >= self.threshold:
+                    candidates.append((-s, idx, field))
+        candidates.sort()
+        mapping, used = {}, set()
+        for _, idx, field in candidates:
+            if field in mapping or idx in used:
+                continue
+            mapping[field] = idx
+            used.add(idx)
+        return {f: mapping[f] for f in self.fields if f in mapping}
+
+
+def targets_for(file_type, fields=None):
+    targets = TARGETS['marg' if file_type == 'marg' else 'pmbi']
+    if fields is not None:
+        targets = {f: a for f, a in targets.items() if f in fields}
+    return targets
+
+
+def name_field(file_type):
+    return NAME_FIELDS['marg' if file_type == 'marg' else 'pmbi']
+
+
+def names_items(file_type, mapping, fields=None):
+    """True when mapping has the name field (or the name field is not wanted)."""
+    field = name_field(file_type)
+    return field in mapping or field not in targets_for(file_type, fields)
+
+
+def header_signature(file_type, headers, fields=None):
+    """Stable key for a header row layout (positions matter, case/punctuation do not)."""
+    wanted = sorted(targets_for(file_type, fields))
+    norm = [''.join(header_tokens(h)) for h in headers]
+    while norm and not norm[-1]:
+        norm.pop()
+    payload = json.dumps([SIGNATURE_VERSION, file_type, wanted, norm])
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class ProfileStore:
+    """Confirmed header mappings keyed by header signature, kept in a JSON file."""
+
+    def __init__(self, path=None):
+        self.path = path or os.environ.get('MED_SYNC_HEADER_PROFILES') or DEFAULT_PROFILE_PATH
+        self._profiles = None
+
+    def _load(self):
+        if self._profiles is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._profiles = json.load(f)
+            except (OSError, ValueError):
+                self._profiles = {}
+        return self._profiles
+
+    def get(self, signature):
+        mapping = self._load().get(signature)
+        return dict(mapping) if mapping else None
+
+    def remember(self, signature, mapping):
+        profiles = self._load()
+        if profiles.get(signature) == mapping:
+            return
+        profiles[signature] = dict(mapping)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(profiles, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+def resolve(file_type, headers, profiles=None, fields=None):
+    """
+    Map a header row to canonical fields.
+    Returns (mapping {field: column index}, signature, cached) where cached is
+    True when the mapping came from the profile store.
+    """
+    signature = header_signature(file_type, headers, fields)
+    if profiles is not None:
+        mapping = profiles.get(signature)
+        if mapping is not None:
+            return mapping, signature, True
+    mapping = HeaderMatcher(targets_for(file_type, fields)).match(headers)
+    return mapping, signature, False
+
+
+def find_header_row(file_type, rows, profiles=None, fields=None, min_fields=2):
+    """
+    Pick the header row among the first rows of a sheet (lists of cell values).
+    Rows with a remembered layout win outright; otherwise the first row where at
+    least min_fields fields match, one of them the name field. Returns
+    (row index, mapping, signature, cached) or None.
+    """
+    if profiles is not None:
+        for i, row in enumerate(rows):
+            signature = header_signature(file_type, row, fields)
+            mapping = profiles.get(signature)
+            if mapping is not None:
+                return i, mapping, signature, True
+    matcher = HeaderMatcher(targets_for(file_type, fields))
+    for i, row in enumerate(rows):
+        if sum(1 for h in row if header_tokens(h)) < min_fields:
+            continue
+        mapping = matcher.match(row)
+        if len(mapping) >= min_fields and names_items(file_type, mapping, fields):
+            return i, mapping, header_signature(file_type, row, fields), False
+    return None
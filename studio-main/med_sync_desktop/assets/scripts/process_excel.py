@@ -1,14 +1,22 @@
 import sys
 import json
 import pandas as pd
-import os
 import re
+import multiprocessing
+from collections import namedtuple
 from datetime import datetime
 
-def normalize_header(h):
-    return str(h).strip().lower().replace(' ', '').replace('.', '').replace('_', '')
+from records import RecordStore, FLOAT, INT, DATE, TEXT, DateFormatter
+import quality
+import header_match
+import snapshots
+import workbook
+import progress as progress_mod
 
-def parse_date(val):
+DATE_OUT_FORMAT = '%d-%m-%y' # dd-MM-yy
+
+def parse_datetime(val):
+    """Return a datetime for val, or None if it is empty or in no known format."""
     if pd.isna(val):
         return None
     s = str(val).strip()
@@ -28,169 +36,269 @@ def parse_date(val):
     
     for fmt in formats:
         try:
-            dt = datetime.strptime(s, fmt)
-            return dt.strftime('%d-%m-%y') # Return dd-MM-yy
+            return datetime.strptime(s, fmt)
         except ValueError:
             continue
-            
-    # Return as is if acts like a string? Or try to clean?
-    # For now return original if parsing fails (maybe it's already correct or weird format)
-    return s
+    return None
+
+def parse_date(val):
+    dt = parse_datetime(val)
+    if dt is not None:
+        return dt.strftime(DATE_OUT_FORMAT)
+    if pd.isna(val) or not str(val).strip():
+        return None
+    # Return original if parsing fails (maybe it's already correct or weird format)
+    return str(val).strip()
+
+def _field_kind(target_key):
+    key = target_key.lower().replace('.', '')
+    if 'mrp' in key:
+        return FLOAT
+    if 'qty' in key or 'stock' in key:
+        return INT
+    if 'exp' in key:
+        return DATE
+    return TEXT
+
+def new_store(target_keys):
+    """Empty RecordStore for the given target keys."""
+    schema = {}
+    for target_key in target_keys:
+        schema.setdefault(target_key, _field_kind(target_key))
+    formatters = {}
+    for target_key, kind in schema.items():
+        if kind == INT:
+            formatters[target_key] = str
+        elif kind == DATE:
+            formatters[target_key] = format_date
+    return RecordStore(schema, id_key='_id', formatters=formatters)
+
+format_date = DateFormatter(DATE_OUT_FORMAT)
+
+def write_items_json(stores, out=None, progress=None):
+    """Stream the stores as one JSON array (to stdout by default), materializing one item dict at a time."""
+    if out is None:
+        out = sys.stdout
+    if isinstance(stores, RecordStore):
+        stores = [stores]
+    if progress is None:
+        progress = progress_mod.current()
+    out.write('[')
+    first = True
+    for store in stores:
+        for item in progress.iterate(store.iter_items()):
+            if not first:
+                out.write(', ')
+            out.write(json.dumps(item))
+            first = False
+    out.write(']\n')
 
-def process_file(file_path, file_type):
+def write_quality_report(results, file_path):
+    """
+    Save the data-quality report next to the input and summarize it on stderr.
+    Multi-store workbooks get one report per store under "stores".
+    """
+    reports = {}
+    for r in results:
+        reports[r.store_id] = quality.validate(r.store, skipped_rows=r.skipped_rows, skipped=len(r.skipped_rows))
+    if len(reports) == 1:
+        report = next(iter(reports.values()))
+    else:
+        report = {"stores": reports}
+    report["source"] = file_path
     try:
-        # Determine engine
-        ext = os.path.splitext(file_path)[1].lower()
-        engine = 'xlrd' if ext == '.xls' else 'openpyxl'
-        
-        # Read file
-        # We read valid rows. Find header first?
-        # Let's read first few rows to find header
-        df_scan = pd.read_excel(file_path, nrows=20, header=None, engine=engine)
-        
-        header_row_idx = -1
-        keywords = []
-        if file_type == 'marg':
-            keywords = ['productname', 'currentstock', 'mrp', 'exp']
-        else:
-            keywords = ['drugname', 'drugcode', 'mrp', 'expirydate', 'qty']
-            
-        # Find header
-        for i, row in df_scan.iterrows():
-            row_str = "".join([str(x).lower() for x in row if pd.notna(x)])
-            matches = sum(1 for k in keywords if k in row_str.replace(' ', '').replace('.', ''))
-            if matches >= 2: # At least 2 matches
-                header_row_idx = i
-                break
+        quality.write_report(report, quality.report_path(file_path))
+    except OSError as e:
+        print(f"Could not write quality report: {e}", file=sys.stderr)
+    for store_id, r in reports.items():
+        for line in quality.summary_lines(r, store_id if len(reports) > 1 else ""):
+            print(line, file=sys.stderr)
+    return report
+
+def write_snapshot(store, file_type, file_path):
+    """Keep a local columnar snapshot of the import; never fails the import itself."""
+    if not snapshots.available():
+        print("pyarrow not installed; snapshot skipped", file=sys.stderr)
+        return None
+    try:
+        path = snapshots.write_snapshot(store, file_type, source=file_path)
+    except Exception as e:  # disk, pyarrow (ArrowInvalid) or an unsaveable formatter
+        print(f"Could not write snapshot: {e}", file=sys.stderr)
+        return None
+    print(f"Snapshot written: {path}", file=sys.stderr)
+    return path
+
+# Items parsed from one sheet; store_id is set when the workbook holds several stores
+SheetItems = namedtuple('SheetItems', 'sheet store_id store skipped_rows signature field_cols cached')
+
+def load_sheet(file_path, sheet_name, file_type, fallback_first_row=False):
+    """
+    Parse one sheet into a RecordStore keyed by '_id'. Runs in a worker process
+    for multi-sheet workbooks, so it only reads the header profile store.
+    Rows without a usable name/code are dropped and summarized in skipped_rows.
+    Rows are counted on progress.current(), which also raises Cancelled.
+    """
+    progress = progress_mod.current()
+    # Find the header in the first rows: a remembered layout wins, otherwise
+    # fuzzy header matching (see header_match.py)
+    frame = workbook.read_sheet_frame(file_path, sheet_name, file_type, fallback_first_row=fallback_first_row)
+    store = new_store(header_match.targets_for(file_type))
+    kinds = store.schema
+    skipped_rows = []
+    if frame.df is None:
+        return SheetItems(sheet_name, None, store, skipped_rows, None, {}, False)
+    df = frame.df
+    progress.add_total(len(df))
+    
+    # field -> column label in df
+    col_map = {field: df.columns[pos] for field, pos in frame.field_cols.items() if pos < len(df.columns)}
+    
+    # Process rows
+    for _, row in progress.iterate(df.iterrows()):
+        item = {}
+        raw = {}
+        replaced = {}
         
-        if header_row_idx == -1:
-            header_row_idx = 0 # Fallback
+        for target_key, src_col in col_map.items():
+            val = row[src_col]
+            if pd.isna(val):
+                continue
             
-        # Read actual data
-        df = pd.read_excel(file_path, header=header_row_idx, engine=engine)
-        
-        # Normalize columns
-        df.columns = [normalize_header(c) for c in df.columns]
-        
-        results = []
+            # Format
+            kind = kinds[target_key]
+            if kind == FLOAT:
+                try:
+                    # Store as float for numeric operations/sorting
+                    # Display handling (2 decimals) is done in Flutter
+                    item[target_key] = float(val)
+                except:
+                    item[target_key] = 0.0
+                    replaced[target_key] = str(val)
+            elif kind == INT:
+                try:
+                    item[target_key] = int(float(val))
+                except:
+                    raw[target_key] = str(val)
+            elif kind == DATE:
+                dt = parse_datetime(val)
+                if dt is not None:
+                    item[target_key] = dt
+                else:
+                    raw[target_key] = parse_date(val)
+            else:
+                item[target_key] = str(val).strip()
         
-        # Define mappings (normalized -> target key)
-        mapping = {}
+        # Generate ID
+        doc_id = None
         if file_type == 'marg':
-            # Target: Product Name, Current Stock, M.R.P., EXP
-            # Source (normalized): productname, currentstock, mrp, exp
-            mapping = {
-                'productname': 'Product Name',
-                'name': 'Product Name',
-                'itemname': 'Product Name',
-                'productname_kn': 'Product Name_kn',
-                'productname_kan': 'Product Name_kn',
-                'currentstock': 'Current Stock',
-                'stock': 'Current Stock',
-                'qty': 'Current Stock',
-                'mrp': 'M.R.P.',
-                'rate': 'M.R.P.',
-                'exp': 'EXP',
-                'expiry': 'EXP'
-            }
+            # Marg: Use Product Name
+            name_key = 'Product Name'
+            if name_key in item and item[name_key]:
+                doc_id = item[name_key].replace('/', '-').replace('\\', '-').strip()
         else:
-            # Target: Drug Name, Drug Code, MRP, Expiry Date, Qty
-            mapping = {
-                'drugname': 'Drug Name',
-                'drugname_kn': 'Drug Name_kn',
-                'drugname_kan': 'Drug Name_kn',
-                'drugcode': 'Drug Code',
-                'code': 'Drug Code',
-                'mrp': 'MRP',
-                'expirydate': 'Expiry Date',
-                'exp': 'Expiry Date',
-                'expiry': 'Expiry Date',
-                'qty': 'Qty',
-                'quantity': 'Qty',
-                'stock': 'Qty',
-                'uom': 'UOM',
-                'batchno': 'Batch No'
-            }
+            # PMBI: Use Drug Code (preferred) or Fallback to Drug Name
+            # Drug Code is cleaner and unique
+            code_key = 'Drug Code'
+            name_key = 'Drug Name'
             
-        # Helper to find column
-        col_map = {}
-        for col in df.columns:
-            for k, v in mapping.items():
-                if k in col: # Contain check? or exact?
-                    # Be strict if possible, or permissive
-                    # "m.r.p." -> "mrp"
-                    if k == col or k == col.replace('.',''):
-                        col_map[v] = col
-                        break
+            if code_key in item and item[code_key]:
+                doc_id = str(item[code_key]).strip()
+            elif name_key in item and item[name_key]:
+                 doc_id = item[name_key].replace('/', '-').replace('\\', '-').strip()
         
-        # Process rows
-        for _, row in df.iterrows():
-            item = {}
-            has_data = False
-            
-            for target_key, src_col in col_map.items():
-                val = row[src_col]
-                if pd.isna(val):
-                    continue
-                    
-                has_data = True
-                
-                # Format
-                if 'mrp' in target_key.lower():
-                    try:
-                        # Store as float for numeric operations/sorting
-                        # Display handling (2 decimals) is done in Flutter
-                        item[target_key] = float(val)
-                    except:
-                        item[target_key] = 0.0
-                elif 'qty' in target_key.lower() or 'stock' in target_key.lower():
-                    try:
-                        item[target_key] = str(int(float(val)))
-                    except:
-                        item[target_key] = str(val)
-                elif 'exp' in target_key.lower():
-                    item[target_key] = parse_date(val)
-                else:
-                    item[target_key] = str(val).strip()
-            
-            # Generate ID
-            if file_type == 'marg':
-                # Marg: Use Product Name
-                name_key = 'Product Name'
-                if name_key in item and item[name_key]:
-                    doc_id = item[name_key].replace('/', '-').replace('\\', '-').strip()
-                    doc_id = re.sub(r'[^\w\-. ]', '_', doc_id)
-                    if len(doc_id) > 150: doc_id = doc_id[:150]
-                    item['_id'] = doc_id
-                    results.append(item)
-            else:
-                # PMBI: Use Drug Code (preferred) or Fallback to Drug Name
-                # Drug Code is cleaner and unique
-                code_key = 'Drug Code'
-                name_key = 'Drug Name'
-                
-                doc_id = None
-                if code_key in item and item[code_key]:
-                    doc_id = str(item[code_key]).strip()
-                elif name_key in item and item[name_key]:
-                     doc_id = item[name_key].replace('/', '-').replace('\\', '-').strip()
-                
-                if doc_id:
-                    # Sanitize ID to be safe for Firestore
-                    doc_id = re.sub(r'[^\w\-. ]', '_', doc_id)
-                    if len(doc_id) > 150: doc_id = doc_id[:150]
-                    item['_id'] = doc_id
-                    results.append(item)
-                
-        print(json.dumps(results))
+        if doc_id:
+            # Sanitize ID to be safe for Firestore
+            doc_id = re.sub(r'[^\w\-. ]', '_', doc_id)
+            if len(doc_id) > 150: doc_id = doc_id[:150]
+            store.append(doc_id, item, raw, replaced)
+        else:
+            skipped_rows.append(" | ".join(f"{k}:{str(v)[:18]}" for k, v in item.items()) or "(empty row)")
+    
+    return SheetItems(sheet_name, None, store, skipped_rows, frame.signature, frame.field_cols, frame.cached)
+
+def _remember_layouts(results):
+    # Only sheets that produced items; the profile store is written here, never in workers
+    profiles = header_match.ProfileStore()
+    for r in results:
+        if len(r.store) and not r.cached:
+            try:
+                profiles.remember(r.signature, r.field_cols)
+            except OSError:
+                pass
+
+def load_workbook(file_path, file_type, workers=None, progress=None):
+    """
+    Parse every sheet that has a recognizable header, in parallel across
+    processes. Returns SheetItems for the sheets that produced items. When
+    several sheets do, each is a store: its items get a 'store_id' field and
+    '<store_id>__' prefixed ids so branches do not overwrite each other.
+    """
+    sheets = workbook.sheet_names(file_path)
+    single = len(sheets) == 1
+    results = workbook.map_sheets(load_sheet, file_path, sheets, file_type, single, workers=workers, progress=progress)
+    for r in results:
+        if not len(r.store) and not single:
+            print(f"Sheet '{r.sheet}': no items, skipped", file=sys.stderr)
+    results = [r for r in results if len(r.store)]
+    _remember_layouts(results)
+    if len(results) > 1:
+        tagged = []
+        for r, store_id in zip(results, workbook.store_ids(r.sheet for r in results)):
+            r.store.constants['store_id'] = store_id
+            r.store.prefix_ids(store_id + '__')
+            tagged.append(r._replace(store_id=store_id))
+        results = tagged
+    return results
+
+def load_items(file_path, file_type, skipped_rows=None, remember=True):
+    """
+    Parse the first sheet of an Excel export into a RecordStore keyed by '_id'.
+    remember=False leaves the header profile store untouched (benchmarks, tests).
+    """
+    result = load_sheet(file_path, 0, file_type, fallback_first_row=True)
+    if remember:
+        _remember_layouts([result])
+    if skipped_rows is not None:
+        skipped_rows.extend(result.skipped_rows)
+    return result.store
+
+def process_file(file_path, file_type, progress=None):
+    """
+    Print the items of an Excel export as a JSON array on stdout; quality
+    summary and progress lines go to stderr. Errors are a {"error": ...}
+    object on stdout, or on stderr once the array has started.
+    """
+    if progress is None:
+        progress = progress_mod.Progress()
+    writing = False
+    try:
+        progress.start('parse')
+        results = load_workbook(file_path, file_type, progress=progress)
+        total = sum(len(r.store) for r in results)
+        progress.start('validate', total)
+        write_quality_report(results, file_path)
+        progress.advance(total)
+        progress.start('snapshot', total)
+        for r in results:
+            snapshot_type = f"{file_type}-{r.store_id}" if r.store_id else file_type
+            write_snapshot(r.store, snapshot_type, file_path)
+            progress.advance(len(r.store))
+        progress.start('write', total)  # last cancel check before the first byte on stdout
+        writing = True
+        write_items_json([r.store for r in results], progress=progress)
+        progress.finish()
         
     except Exception as e:
-        print(json.dumps({"error": str(e)}))
+        print(json.dumps({"error": str(e)}), file=sys.stderr if writing else sys.stdout)
         sys.exit(1)
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support() # sheet workers in the PyInstaller exe
     if len(sys.argv) < 3:
         print(json.dumps({"error": "Usage: process_excel.py <path> <type>"}))
         sys.exit(1)
         
-    process_file(sys.argv[1], sys.argv[2])
+    progress = progress_mod.Progress(sink=progress_mod.stderr_sink)
+    progress_mod.cancel_on_signals(progress)
+    progress_mod.cancel_on_stdin(progress)
+    process_file(sys.argv[1], sys.argv[2], progress)
@@ -0,0 +1,230 @@
+"""
+progress.py - throttled progress reporting and cooperative cancellation
+
+An import reports its stage, rows done, rows total and ETA through a Progress.
+Updates go to a sink at most once per MIN_INTERVAL seconds; stage changes and
+finish() always go through. process_excel writes them to stderr as one JSON
+line each (stdout stays the items array), read by the Dart UI:
+    {"progress": {"stage": "parse", "done": 12000, "total": 200000, "eta": 41.5}}
+desk.py shows them in its window.
+
+Cancellation is cooperative: row loops go through Progress.iterate(), which
+checks the cancel flag every CHUNK_ROWS rows and raises Cancelled. Counters and
+the flag live in shared memory, so sheet workers (workbook.map_sheets) report
+rows and stop too; a worker still inside pandas.read_excel is terminated by
+the parent instead. process_excel is cancelled by SIGINT/SIGTERM or by a
+"cancel" line on stdin (what the Dart UI sends).
+"""
+import _thread
+import json
+import multiprocessing
+import signal
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+MIN_INTERVAL = 0.5  # seconds between two updates of the same stage
+CHUNK_ROWS = 1000  # rows between two cancel checks (a few ms of work)
+
+
+class Cancelled(Exception):
+    """Raised by Progress.check() once cancel() was called."""
+
+
+class Progress:
+    """Stage, row counters, ETA and cancel flag of one import."""
+
+    def __init__(self, sink=None, min_interval=MIN_INTERVAL, shared=None, clock=time.monotonic):
+        self.sink = sink
+        self.min_interval = min_interval
+        self._clock = clock
+        if shared is None:
+            shared = (multiprocessing.Event(), multiprocessing.Value('q', 0), multiprocessing.Value('q', 0))
+        self._cancel, self._done, self._total = shared
+        self.stage = None
+        self._last = None
+        self._sent = None
+        self._base = None  # (time, done) when rows were first seen in this stage
+
+    def shared(self):
+        """Cancel flag and counters, for Progress(shared=...) in a worker process."""
+        return self._cancel, self._done, self._total
+
+    # Cancellation
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check(self):
+        if self._cancel.is_set():
+            raise Cancelled('import cancelled')
+
+    # Counters
+    @property
+    def done(self):
+        return self._done.value
+
+    @property
+    def total(self):
+        return self._total.value
+
+    def start(self, stage, total=0):
+        """Begin a stage; emits the final state of the previous one and the new stage."""
+        self.check()
+        if self.stage is not None and self.done:
+            self.update(force=True)
+        self.stage = stage
+        self._done.value = 0
+        self._total.value = total
+        self._base = None
+        self.update(force=True)
+
+    def add_total(self, n):
+        """Grow the stage total (sheet workers learn their row count after reading)."""
+        with self._total.get_lock():
+            self._total.value += n
+
+    def advance(self, n=1):
+        with self._done.get_lock():
+            self._done.value += n
+        self.check()
+        self.update()
+
+    def iterate(self, iterable, chunk=CHUNK_ROWS):
+        """Yield from iterable, counting rows and checking for cancellation every chunk rows."""
+        n = 0
+        for item in iterable:
+            yield item
+            n += 1
+            if n == chunk:
+                self.advance(n)
+                n = 0
+        if n:
+            self.advance(n)
+
+    def finish(self):
+        self.update(force=True)
+
+    # Reporting
+    def eta(self):
+        """Seconds left at the rate since rows were first counted (the read before that is excluded)."""
+        done, total = self.done, self.total
+        if total and done >= total:
+            return 0.0
+        if not done:
+            return None
+        now = self._clock()
+        if self._base is None:
+            self._base = (now, done)
+            return None
+        since, base_done = self._base
+        if done <= base_done:
+            return None
+        return (now - since) * (total - done) / (done - base_done)
+
+    def snapshot(self):
+        eta = self.eta()
+        return {'stage': self.stage, 'done': self.done, 'total': self.total,
+                'eta': None if eta is None else round(eta, 1)}
+
+    def update(self, force=False):
+        """Send the current state to the sink unless the last update was too recent."""
+        if self.sink is None:
+            return
+        now = self._clock()
+        if not force and self._last is not None and now - self._last < self.min_interval:
+            return
+        update = self.snapshot()
+        if update == self._sent:
+            return
+        self._last, self._sent = now, update
+        self.sink(update)
+
+
+def format_update(update):
+    """'parse: 12,000/200,000 rows (6%), ETA 42s' for logs and status lines."""
+    done, total, eta = update['done'], update['total'], update['eta']
+    if total:
+        text = f"{update['stage']}: {done:,}/{total:,} rows ({100 * done // total}%)"
+    elif done:
+        text = f"{update['stage']}: {done:,} rows"
+    else:
+        text = f"{update['stage']}..."
+    if eta is not None and done < total:
+        text += f", ETA {eta:.0f}s"
+    return text
+
+
+def stderr_sink(update):
+    print(json.dumps({'progress': update}), file=sys.stderr, flush=True)
+
+
+def cancel_on_signals(progress):
+    """Turn SIGINT/SIGTERM (SIGBREAK on Windows) into a cancel of progress in the main thread."""
+    def handler(signum, frame):
+        progress.cancel()
+        raise Cancelled('import cancelled')
+    for name in ('SIGINT', 'SIGTERM', 'SIGBREAK'):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), handler)
+
+
+def cancel_on_stdin(progress, stream=None):
+    """
+    Cancel progress when a "cancel" line arrives on stdin (stream), read by a
+    daemon thread. This is how the Dart UI cancels on Windows, where killing the
+    process is TerminateProcess: no signal handler runs, and neither sheet
+    workers nor the PyInstaller onefile child are stopped. The main thread is
+    interrupted as by SIGINT, so cancel_on_signals() must be installed too.
+    End of input only stops the watcher.
+    """
+    stream = sys.stdin if stream is None else stream
+    if stream is None:  # no console (pythonw)
+        return None
+
+    def watch():
+        for line in stream:
+            if line.strip() == 'cancel':
+                progress.cancel()
+                _thread.interrupt_main()
+                return
+    thread = threading.Thread(target=watch, name='cancel-on-stdin', daemon=True)
+    thread.start()
+    return thread
+
+
+# ---------------------------
+# Progress of the current process (sheet workers)
+# ---------------------------
+_current = None
+
+
+def current():
+    """Progress attached to this process, or a silent one."""
+    global _current
+    if _current is None:
+        _current = Progress()
+    return _current
+
+
+def attach_shared(shared):
+    """Process pool initializer: report to the parent's counters and cancel flag."""
+    global _current
+    _current = Progress(shared=shared) if shared is not None else None
+
+
+@contextmanager
+def attached(progress):
+    """Make progress current() while sheets are parsed in this process."""
+    global _current
+    previous = _current
+    if progress is not None:
+        _current = progress
+    try:
+        yield progress
+    finally:
+        _current = previous
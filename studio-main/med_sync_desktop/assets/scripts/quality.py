@@ -0,0 +1,119 @@
+"""
+quality.py - data-quality report for a parsed RecordStore
+
+Runs once per import, after parsing, over whole columns with NumPy/pandas
+instead of logging bad rows one at a time. Checks by column kind:
+ - FLOAT (MRP):          non-numeric values
+ - INT (stock/qty):      non-numeric values, negative values
+ - DATE (expiry):        unparseable values, dates already in the past
+ - ids:                  duplicate document ids (later rows overwrite earlier ones)
+ - skipped rows:         rows dropped because no name/code could be found
+Each issue carries a count and a few sample rows. The report is a plain dict
+that write_report() saves as JSON and summary_lines() turns into log lines.
+"""
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from records import FLOAT, INT, DATE, INT_MISSING, EPOCH
+
+SAMPLE_SIZE = 5
+
+
+def _samples(store, indices, values=None, limit=SAMPLE_SIZE):
+    out = []
+    for i in indices[:limit]:
+        i = int(i)
+        sample = {"row": i, "id": store.ids[i]}
+        if values is not None:
+            sample["value"] = values[i]
+        out.append(sample)
+    return out
+
+
+def _issue(check, field, store, indices, values=None):
+    return {
+        "check": check,
+        "field": field,
+        "count": len(indices),
+        "samples": _samples(store, indices, values),
+    }
+
+
+def validate(store, now=None, skipped_rows=None, skipped=0):
+    """
+    Build the quality report for store. skipped / skipped_rows describe rows the
+    parser dropped before they reached the store (count and short summaries).
+    """
+    now = now or datetime.now()
+    now_seconds = (now - EPOCH).total_seconds()
+    issues = []
+
+    for field, kind in store.schema.items():
+        if kind not in (FLOAT, INT, DATE):
+            continue
+        rejected = store.rejected_values(field)
+        if rejected:
+            check = "unparseable_date" if kind == DATE else "non_numeric"
+            issues.append(_issue(check, field, store, sorted(rejected), rejected))
+
+        col = store.column(field)
+        if kind == INT:
+            bad = np.flatnonzero((col < 0) & (col != INT_MISSING))
+            if len(bad):
+                issues.append(_issue("negative", field, store, bad, {int(i): int(col[i]) for i in bad[:SAMPLE_SIZE]}))
+        elif kind == DATE:
+            # NaN (missing/unparseable) compares False, so only real past dates count
+            bad = np.flatnonzero(col < now_seconds)
+            if len(bad):
+                values = {int(i): store.get(field, int(i)) for i in bad[:SAMPLE_SIZE]}
+                issues.append(_issue("expired", field, store, bad, values))
+
+    if len(store):
+        dup = np.flatnonzero(pd.Series(store.ids).duplicated(keep="first").to_numpy())
+        if len(dup):
+            issues.append(_issue("duplicate_id", store.id_key, store, dup))
+
+    if skipped:
+        issues.append({
+            "check": "skipped",
+            "field": None,
+            "count": skipped,
+            "samples": list(skipped_rows or [])[:SAMPLE_SIZE],
+        })
+
+    return {
+        "generated_at": now.isoformat(timespec="seconds"),
+        "rows": len(store),
+        "issues": issues,
+    }
+
+
+def report_path(source_path):
+    """Report file written next to the imported Excel file."""
+    base, _ = os.path.splitext(source_path)
+    return base + ".quality.json"
+
+
+def write_report(report, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+    return path
+
+
+def summary_lines(report, label=""):
+    prefix = f"{label} " if label else ""
+    if not report["issues"]:
+        return [f"{prefix}quality: {report['rows']} rows, no issues"]
+    lines = [f"{prefix}quality: {report['rows']} rows, {len(report['issues'])} issue type(s)"]
+    for issue in report["issues"]:
+        field = f" [{issue['field']}]" if issue["field"] else ""
+        examples = ", ".join(
+            str(s.get("value", s.get("id", s))) if isinstance(s, dict) else str(s)
+            for s in issue["samples"][:3]
+        )
+        lines.append(f"  {issue['check']}{field}: {issue['count']} (e.g. {examples})")
+    return lines
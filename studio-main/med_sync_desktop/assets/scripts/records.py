@@ -0,0 +1,288 @@
+"""
+records.py - compact column store for parsed inventory items
+
+Parsed rows used to live as one dict per item (plus a copy per item for the
+metadata document). RecordStore keeps the same data column-wise instead:
+ - FLOAT / DATE fields in array('d') (NaN = missing, dates as seconds since 1970-01-01)
+ - INT fields in array('q') (INT_MISSING = missing)
+ - TEXT fields in a plain list with interned strings (names, codes, UOM repeat a lot)
+Values that could not be parsed are kept verbatim in a sparse side table per
+field so nothing is lost; values replaced by a fallback (e.g. MRP 0.0) are
+remembered too so validation can report them. Cells that were present but
+empty are one byte per row in a per-field mask, only for fields that have any. Dicts are only built by item()/iter_items()
+when serializing.
+"""
+import math
+import sys
+from array import array
+from datetime import datetime, timedelta
+
+import numpy as np
+
+FLOAT = "float"
+INT = "int"
+DATE = "date"
+TEXT = "text"
+
+INT_MISSING = -(2 ** 63)
+EPOCH = datetime(1970, 1, 1)
+
+_MISSING = object()
+
+
+def _intern(v):
+    return sys.intern(v) if isinstance(v, str) else v
+
+
+def _convert(kind, v):
+    """Column representation of a parsed value; raises before anything is stored."""
+    if kind == TEXT:
+        return _intern(v)
+    if kind == FLOAT:
+        return math.nan if v is None else float(v)
+    if kind == INT:
+        if v is None:
+            return INT_MISSING
+        n = int(v)
+        if not INT_MISSING < n < 2 ** 63:
+            raise OverflowError(f"{v!r} does not fit a 64-bit integer column")
+        return n
+    if v is None:
+        return math.nan
+    if getattr(v, "tzinfo", None) is not None:
+        # expiry dates are calendar dates: keep the wall-clock date of the export
+        v = v.replace(tzinfo=None)
+    return (v - EPOCH).total_seconds()
+
+
+class DateFormatter:
+    """Formatter writing DATE values with strftime(fmt); a class so stores pickle (sheet workers)."""
+
+    __slots__ = ("fmt",)
+
+    def __init__(self, fmt):
+        self.fmt = fmt
+
+    def __call__(self, dt):
+        return dt.strftime(self.fmt)
+
+    @property
+    def tag(self):
+        return "date:" + self.fmt
+
+
+def formatter_tag(func):
+    """Name a formatter is saved under (snapshots), or None when it has none."""
+    if func is str:
+        return "str"
+    return getattr(func, "tag", None)
+
+
+def formatter_from_tag(tag):
+    if tag == "str":
+        return str
+    if tag.startswith("date:"):
+        return DateFormatter(tag[len("date:"):])
+    raise ValueError(f"Unknown formatter '{tag}'")
+
+
+class RecordStore:
+    """Parallel typed columns for one collection of items."""
+
+    __slots__ = ("schema", "id_key", "constants", "formatters", "ids", "_cols", "_raw", "_replaced", "_empty")
+
+    def __init__(self, schema, id_key="id", constants=None, formatters=None):
+        """
+        schema: ordered {field: kind}; kind is FLOAT, INT, DATE or TEXT.
+        constants: fields added unchanged to every materialized item.
+        formatters: optional {field: callable} applied to parsed values on output;
+            str and DateFormatter ones can be saved with a snapshot.
+        """
+        self.schema = dict(schema)
+        self.id_key = id_key
+        self.constants = dict(constants or {})
+        self.formatters = dict(formatters or {})
+        self.ids = []
+        self._cols = {}
+        self._raw = {}  # field -> {index: original value that failed to parse}
+        self._replaced = {}  # field -> {index: original value replaced by a fallback}
+        self._empty = {}  # field -> bytearray, 1 where the source cell was present but empty
+        for field, kind in self.schema.items():
+            if kind in (FLOAT, DATE):
+                self._cols[field] = array("d")
+            elif kind == INT:
+                self._cols[field] = array("q")
+            elif kind == TEXT:
+                self._cols[field] = []
+            else:
+                raise ValueError(f"Unknown column kind '{kind}' for field '{field}'")
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_columns(cls, schema, ids, columns, raw=None, empty=None, **kwargs):
+        """
+        Build a store from whole columns (e.g. a snapshot) without per-item appends.
+        columns: {field: sequence} in the column() representation (NaN / INT_MISSING /
+        None for missing); raw: {field: {index: original value}}; empty: {field:
+        indices of present but empty cells}.
+        """
+        store = cls(schema, **kwargs)
+        store.ids = [_intern(v) for v in ids]
+        n = len(store.ids)
+        for field, kind in store.schema.items():
+            values = columns.get(field)
+            if values is None:
+                if kind == TEXT:
+                    store._cols[field] = [None] * n
+                elif kind == INT:
+                    store._cols[field] = array("q", [INT_MISSING]) * n
+                else:
+                    store._cols[field] = array("d", [math.nan]) * n
+            elif kind == TEXT:
+                store._cols[field] = [_intern(v) for v in values]
+            elif kind == INT:
+                store._cols[field] = array("q", np.asarray(values, dtype=np.int64).tobytes())
+            else:
+                store._cols[field] = array("d", np.asarray(values, dtype=np.float64).tobytes())
+            if len(store._cols[field]) != n:
+                raise ValueError(f"Column '{field}' has {len(store._cols[field])} values, expected {n}")
+        for field, values in (raw or {}).items():
+            if values:
+                store._raw[field] = {idx: _intern(v) for idx, v in values.items()}
+        for field, indices in (empty or {}).items():
+            for idx in indices:
+                store._mark_empty(field, idx)
+        return store
+
+    # ---------------------------
+    # Building
+    # ---------------------------
+    def append(self, doc_id, values, raw=None, replaced=None):
+        """
+        Add one item. values holds already-parsed values (float, int, datetime, str);
+        raw holds fields whose source value could not be parsed and is kept as-is;
+        a raw None marks a present but empty cell (materialized as None). Fields
+        absent from both are missing for this item. replaced records the source
+        value of fields that were stored as a fallback in values.
+        """
+        # convert everything first so a bad value cannot leave the columns misaligned
+        converted = [(self._cols[field], _convert(kind, values.get(field))) for field, kind in self.schema.items()]
+        idx = len(self.ids)
+        for col, v in converted:
+            col.append(v)
+        self.ids.append(_intern(doc_id))
+        if raw:
+            for field, v in raw.items():
+                if field not in self.schema:
+                    continue
+                if v is None:
+                    self._mark_empty(field, idx)
+                else:
+                    self._raw.setdefault(field, {})[idx] = _intern(v)
+        if replaced:
+            for field, v in replaced.items():
+                if field in self.schema:
+                    self._replaced.setdefault(field, {})[idx] = v
+        return idx
+
+    def _mark_empty(self, field, idx):
+        mask = self._empty.get(field)
+        if mask is None:
+            mask = self._empty[field] = bytearray()
+        if len(mask) <= idx:
+            mask.extend(bytes(idx + 1 - len(mask)))
+        mask[idx] = 1
+
+    def prefix_ids(self, prefix):
+        """Prefix every document id (e.g. with a store id when merging stores)."""
+        self.ids = [_intern(prefix + str(i)) for i in self.ids]
+
+    # ---------------------------
+    # Column access
+    # ---------------------------
+    def column(self, field):
+        """
+        NumPy view of a column: float64 for FLOAT/DATE (NaN = missing), int64 for
+        INT (INT_MISSING = missing), object array for TEXT. Numeric views share
+        memory with the store and must not outlive further append() calls.
+        """
+        kind = self.schema[field]
+        col = self._cols[field]
+        if kind in (FLOAT, DATE):
+            return np.frombuffer(col, dtype=np.float64) if len(col) else np.empty(0, dtype=np.float64)
+        if kind == INT:
+            return np.frombuffer(col, dtype=np.int64) if len(col) else np.empty(0, dtype=np.int64)
+        return np.array(col, dtype=object)
+
+    def raw_values(self, field):
+        """{index: original value} for rows whose field failed to parse."""
+        return dict(self._raw.get(field, ()))
+
+    def empty_indices(self, field):
+        """Indices of rows whose field was present but empty in the source."""
+        mask = self._empty.get(field)
+        if not mask:
+            return []
+        return np.flatnonzero(np.frombuffer(mask, dtype=np.uint8)).tolist()
+
+    def rejected_values(self, field):
+        """{index: original value} for non-empty source values that failed to parse."""
+        out = dict(self._replaced.get(field, ()))
+        for i, v in self._raw.get(field, {}).items():
+            if str(v).strip() != "":
+                out[i] = v
+        return out
+
+    def get(self, field, idx, default=None):
+        v = self._value(field, idx)
+        return default if v is _MISSING else v
+
+    def _value(self, field, idx):
+        raw = self._raw.get(field)
+        if raw:
+            v = raw.get(idx, _MISSING)
+            if v is not _MISSING:
+                return v
+        kind = self.schema[field]
+        v = self._cols[field][idx]
+        if kind == TEXT:
+            if v is None:
+                return self._missing(field, idx)
+            return v
+        if kind == INT:
+            if v == INT_MISSING:
+                return self._missing(field, idx)
+        elif math.isnan(v):
+            return self._missing(field, idx)
+        elif kind == DATE:
+            v = EPOCH + timedelta(seconds=v)
+        fmt = self.formatters.get(field)
+        return fmt(v) if fmt else v
+
+    def _missing(self, field, idx):
+        mask = self._empty.get(field)
+        return None if mask is not None and idx < len(mask) and mask[idx] else _MISSING
+
+    # ---------------------------
+    # Serialization boundary
+    # ---------------------------
+    def item(self, idx, with_id=True):
+        """Materialize one item as a dict (schema order, then constants, then id)."""
+        out = {}
+        for field in self.schema:
+            v = self._value(field, idx)
+            if v is not _MISSING:
+                out[field] = v
+        out.update(self.constants)
+        if with_id:
+            out[self.id_key] = self.ids[idx]
+        return out
+
+    def iter_items(self, with_id=True):
+        for idx in range(len(self.ids)):
+            yield self.item(idx, with_id)
+
+    def to_items(self, with_id=True):
+        return list(self.iter_items(with_id))
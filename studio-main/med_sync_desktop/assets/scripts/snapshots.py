@@ -0,0 +1,222 @@
+"""
+snapshots.py - versioned local snapshots of imported inventory
+
+Each import is written as an uncompressed Arrow IPC file (Feather v2):
+    <snapshot dir>/<file type>/<file type>_v000042.arrow
+one column per RecordStore field plus "_id", with the field kinds,
+constants, formatters, source file and import time in the schema metadata. Values that failed to parse go
+to a sparse "<field>__raw" string column, cells that were present but empty
+to a "<field>__empty" boolean column (only for fields that have them). Files are opened through a memory
+map, so later stages (diff, validation, re-publish) read columns zero-copy
+instead of re-reading the Excel file. Only the newest SNAPSHOT_KEEP versions
+per file type are kept.
+
+Requires pyarrow; when it is missing snapshots are skipped (available() is False).
+"""
+import json
+import os
+import re
+from datetime import datetime
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # optional: the import itself works without snapshots
+    pa = None
+
+from records import RecordStore, FLOAT, INT, DATE, INT_MISSING, formatter_tag, formatter_from_tag
+
+SNAPSHOT_KEEP = 5
+DEFAULT_SNAPSHOT_DIR = os.path.join(os.path.expanduser('~'), '.med_sync', 'snapshots')
+ID_COLUMN = '_id'
+RAW_SUFFIX = '__raw'
+EMPTY_SUFFIX = '__empty'
+
+_NAME_RE = re.compile(r'^(?P<type>[\w-]+)_v(?P<version>\d{6})\.arrow$')
+
+
+def available():
+    return pa is not None
+
+
+def snapshot_dir(file_type, base_dir=None):
+    base = base_dir or os.environ.get('MED_SYNC_SNAPSHOT_DIR') or DEFAULT_SNAPSHOT_DIR
+    return os.path.join(base, file_type)
+
+
+def list_snapshots(file_type, base_dir=None):
+    """[(version, path)] oldest first."""
+    directory = snapshot_dir(file_type, base_dir)
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    found = []
+    for name in names:
+        m = _NAME_RE.match(name)
+        if m and m.group('type') == file_type:
+            found.append((int(m.group('version')), os.path.join(directory, name)))
+    return sorted(found)
+
+
+def latest_snapshot(file_type, base_dir=None):
+    snaps = list_snapshots(file_type, base_dir)
+    return snaps[-1][1] if snaps else None
+
+
+# ---------------------------
+# Writing
+# ---------------------------
+def _arrow_column(store, field, kind):
+    col = store.column(field)
+    if kind == FLOAT:
+        return pa.array(col, type=pa.float64(), mask=np.isnan(col))
+    if kind == INT:
+        return pa.array(col, type=pa.int64(), mask=(col == INT_MISSING))
+    if kind == DATE:
+        missing = np.isnan(col)
+        millis = np.where(missing, 0, np.round(col * 1000)).astype(np.int64)
+        return pa.array(millis, type=pa.timestamp('ms'), mask=missing)
+    return pa.array([None if v is None else str(v) for v in col], type=pa.string())
+
+
+def to_table(store, metadata=None):
+    """Arrow table for a RecordStore (TEXT values are stored as strings)."""
+    names = [ID_COLUMN]
+    arrays = [pa.array(store.ids, type=pa.string())]
+    for field, kind in store.schema.items():
+        names.append(field)
+        arrays.append(_arrow_column(store, field, kind))
+    n = len(store)
+    for field in store.schema:
+        raw = store.raw_values(field)
+        if raw:
+            values = [None] * n
+            for idx, v in raw.items():
+                values[idx] = None if v is None else str(v)
+            names.append(field + RAW_SUFFIX)
+            arrays.append(pa.array(values, type=pa.string()))
+        empty = store.empty_indices(field)
+        if empty:
+            flags = np.zeros(n, dtype=bool)
+            flags[empty] = True
+            names.append(field + EMPTY_SUFFIX)
+            arrays.append(pa.array(flags, type=pa.bool_()))
+    constants, deferred = {}, []
+    for key, value in store.constants.items():
+        try:
+            json.dumps(value)
+        except TypeError:  # e.g. firestore.SERVER_TIMESTAMP: given again by whoever publishes
+            deferred.append(key)
+        else:
+            constants[key] = value
+    formatters = {}
+    for field, func in store.formatters.items():
+        tag = formatter_tag(func)
+        if tag is None:
+            raise ValueError(f"Formatter of '{field}' cannot be saved in a snapshot")
+        formatters[field] = tag
+    meta = {
+        'kinds': json.dumps(store.schema),
+        'id_key': store.id_key,
+        'constants': json.dumps(constants),
+        'deferred_constants': json.dumps(deferred),
+        'formatters': json.dumps(formatters),
+    }
+    meta.update({k: str(v) for k, v in (metadata or {}).items()})
+    table = pa.Table.from_arrays(arrays, names=names)
+    return table.replace_schema_metadata({k.encode(): v.encode() for k, v in meta.items()})
+
+
+def write_snapshot(store, file_type, source=None, base_dir=None, keep=SNAPSHOT_KEEP):
+    """Write store as the next snapshot version and prune old ones. Returns the path."""
+    if pa is None:
+        raise RuntimeError("pyarrow is not installed; snapshots are unavailable")
+    directory = snapshot_dir(file_type, base_dir)
+    os.makedirs(directory, exist_ok=True)
+    snaps = list_snapshots(file_type, base_dir)
+    version = snaps[-1][0] + 1 if snaps else 1
+    path = os.path.join(directory, f"{file_type}_v{version:06d}.arrow")
+
+    table = to_table(store, {
+        'file_type': file_type,
+        'version': version,
+        'source': source or '',
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+    })
+    tmp = path + '.tmp'
+    with pa.OSFile(tmp, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, path)
+    prune(file_type, keep, base_dir)
+    return path
+
+
+def prune(file_type, keep=SNAPSHOT_KEEP, base_dir=None):
+    """Delete all but the newest keep snapshots. Returns the removed paths."""
+    snaps = list_snapshots(file_type, base_dir)
+    removed = []
+    for _, path in snaps[:max(0, len(snaps) - keep)]:
+        try:
+            os.remove(path)
+            removed.append(path)
+        except OSError:
+            pass  # still mapped by a reader (Windows); retried on the next import
+    return removed
+
+
+# ---------------------------
+# Reading
+# ---------------------------
+def open_snapshot(path):
+    """Memory-map a snapshot and return its Arrow table (zero-copy column buffers)."""
+    if pa is None:
+        raise RuntimeError("pyarrow is not installed; snapshots are unavailable")
+    source = pa.memory_map(path, 'r')
+    return pa.ipc.open_file(source).read_all()
+
+
+def snapshot_info(table):
+    meta = {k.decode(): v.decode() for k, v in (table.schema.metadata or {}).items()}
+    for key, default in (('kinds', '{}'), ('constants', '{}'), ('deferred_constants', '[]'), ('formatters', '{}')):
+        meta[key] = json.loads(meta.get(key, default))
+    return meta
+
+
+def to_store(table, constants=None, **kwargs):
+    """
+    Rebuild a RecordStore from a snapshot table (e.g. to re-publish without the
+    Excel file), with its constants and formatters. constants are added to the
+    saved ones and must cover the deferred ones (values JSON cannot hold).
+    """
+    info = snapshot_info(table)
+    constants = dict(info['constants'], **(constants or {}))
+    missing = [key for key in info['deferred_constants'] if key not in constants]
+    if missing:
+        raise ValueError(f"Snapshot constants not saved, pass them in constants=: {', '.join(missing)}")
+    schema = info['kinds']
+    columns, raw, empty = {}, {}, {}
+    for field, kind in schema.items():
+        chunked = table.column(field)
+        if kind == FLOAT:
+            columns[field] = chunked.to_numpy()
+        elif kind == INT:
+            columns[field] = chunked.fill_null(INT_MISSING).to_numpy()
+        elif kind == DATE:
+            millis = chunked.cast(pa.int64()).to_numpy(zero_copy_only=False).astype(np.float64)
+            columns[field] = millis / 1000.0
+        else:
+            columns[field] = chunked.to_pylist()
+        raw_name = field + RAW_SUFFIX
+        if raw_name in table.column_names:
+            raw[field] = {i: v for i, v in enumerate(table.column(raw_name).to_pylist()) if v is not None}
+        empty_name = field + EMPTY_SUFFIX
+        if empty_name in table.column_names:
+            empty[field] = np.flatnonzero(table.column(empty_name).to_numpy(zero_copy_only=False)).tolist()
+    kwargs.setdefault('id_key', info.get('id_key', 'id'))
+    kwargs.setdefault('formatters', {f: formatter_from_tag(tag) for f, tag in info['formatters'].items()})
+    return RecordStore.from_columns(schema, table.column(ID_COLUMN).to_pylist(), columns, raw, empty,
+                                    constants=constants, **kwargs)
@@ -0,0 +1,140 @@
+"""
+workbook.py - sheet discovery and parallel per-sheet parsing
+
+Consolidated PMBI reports and multi-branch Marg exports put each store (or
+category) on its own sheet. Every sheet gets its own header detection
+(header_match.find_header_row); sheets without a recognizable header (cover
+pages, summaries) are skipped. Sheets are parsed in worker processes so a
+workbook with many large sheets uses all cores; a single sheet is parsed
+in-process.
+
+Functions passed to map_sheets must be importable module-level functions
+(they are pickled to the workers). Frozen executables must call
+multiprocessing.freeze_support() first thing in __main__. Workers report rows
+and see cancellation through progress.current() (see progress.py).
+"""
+import multiprocessing
+import os
+import re
+from collections import namedtuple
+
+import pandas as pd
+
+import header_match
+import progress as progress_mod
+
+SCAN_ROWS = 20
+POLL_INTERVAL = 0.1  # seconds between progress/cancel polls while workers run
+
+# Header location of one sheet; df is None when no header was found
+SheetFrame = namedtuple('SheetFrame', 'sheet df header_row field_cols signature cached')
+
+
+def engine_for(path):
+    return 'xlrd' if os.path.splitext(path)[1].lower() == '.xls' else 'openpyxl'
+
+
+def open_book(path):
+    """
+    ExcelFile for path. .xls books load sheets on demand: without it xlrd parses
+    every sheet of the book whenever one sheet is read.
+    """
+    engine = engine_for(path)
+    return pd.ExcelFile(path, engine=engine, engine_kwargs={'on_demand': True} if engine == 'xlrd' else None)
+
+
+def sheet_names(path):
+    with open_book(path) as xl:
+        return list(xl.sheet_names)
+
+
+def store_id_for(sheet_name):
+    """Store id derived from a sheet name: 'Branch 2 (Hubli)' -> 'Branch_2_Hubli'."""
+    s = re.sub(r'[^\w-]+', '_', str(sheet_name).strip()).strip('_')
+    return s or 'sheet'
+
+
+def store_ids(sheet_names):
+    """
+    Unique store ids for sheet_names, in order. Names that map to the same id
+    (also when only the case differs: snapshot folders) get '_2', '_3', ...:
+    'Branch 1', 'Branch (1)' -> 'Branch_1', 'Branch_1_2'.
+    """
+    ids, taken = [], set()
+    for name in sheet_names:
+        base = store_id = store_id_for(name)
+        n = 2
+        while store_id.lower() in taken:
+            store_id = f"{base}_{n}"
+            n += 1
+        taken.add(store_id.lower())
+        ids.append(store_id)
+    return ids
+
+
+def read_sheet_frame(path, sheet_name, file_type, fields=None, fallback_first_row=False, dtype=None):
+    """
+    Locate the header of one sheet and read it as a DataFrame.
+    Remembered layouts are looked up in the profile store, nothing is written to it.
+    The book is opened once for the header scan and the read.
+    """
+    with open_book(path) as xl:
+        return _read_sheet_frame(xl, sheet_name, file_type, fields, fallback_first_row, dtype)
+
+
+def _read_sheet_frame(xl, sheet_name, file_type, fields, fallback_first_row, dtype):
+    df_scan = xl.parse(sheet_name, nrows=SCAN_ROWS, header=None)
+    scan_rows = [[None if pd.isna(x) else x for x in row] for row in df_scan.itertuples(index=False, name=None)]
+    found = header_match.find_header_row(file_type, scan_rows, header_match.ProfileStore(), fields)
+    if found is None and fallback_first_row:
+        # Fallback: first row, whatever matches, as long as it names the items
+        first = scan_rows[0] if scan_rows else []
+        mapping, signature, cached = header_match.resolve(file_type, first, fields=fields)
+        if header_match.names_items(file_type, mapping, fields):
+            found = (0, mapping, signature, cached)
+    if found is None:
+        return SheetFrame(sheet_name, None, None, {}, None, False)
+    header_row, field_cols, signature, cached = found
+    df = xl.parse(sheet_name, header=header_row, dtype=dtype)
+    return SheetFrame(sheet_name, df, header_row, field_cols, signature, cached)
+
+
+def default_workers(n_sheets):
+    return max(1, min(n_sheets, os.cpu_count() or 1))
+
+
+def map_sheets(func, path, sheets, *args, workers=None, progress=None, isolate=False):
+    """
+    Call func(path, sheet, *args) for every sheet and return the results in
+    sheet order. Uses a process pool when there is more than one sheet and
+    more than one worker, or always with isolate=True so cancelling can stop
+    a sheet in the middle of pandas.read_excel (workers are terminated).
+    """
+    sheets = list(sheets)
+    workers = default_workers(len(sheets)) if workers is None else max(1, workers)
+    if not sheets or (not isolate and (len(sheets) == 1 or workers == 1)):
+        with progress_mod.attached(progress):
+            return [func(path, sheet, *args) for sheet in sheets]
+    shared = progress.shared() if progress is not None else None
+    pool = multiprocessing.Pool(min(workers, len(sheets)),
+                                initializer=progress_mod.attach_shared, initargs=(shared,))
+    try:
+        results = [pool.apply_async(func, (path, sheet) + args) for sheet in sheets]
+        pending = results
+        while pending:
+            pending[0].wait(POLL_INTERVAL)
+            if progress is not None:
+                progress.check()
+                progress.update()
+            for r in pending:
+                if r.ready():
+                    r.get()  # re-raise a worker error now, not after the other sheets
+            pending = [r for r in pending if not r.ready()]
+        pool.close()
+        return [r.get() for r in results]
+    except BaseException:
+        # workers busy inside read_excel never reach a cancel check
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
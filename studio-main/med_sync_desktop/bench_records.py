@@ -0,0 +1,57 @@
+"""
+Measure memory of parsed items: RecordStore columns vs one dict per item.
+
+Writes synthetic MARG/PMBI workbooks, parses them with process_excel.load_items
+and reports tracemalloc sizes for the store and for the equivalent list of dicts.
+
+Usage: python bench_records.py [rows ...]   (default: 5000 20000)
+"""
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "assets", "scripts"))
+sys.path.insert(0, os.path.join(HERE, "test", "python"))  # synthetic workbooks shared with the tests
+
+from process_excel import load_items
+from sample_data import write_synthetic
+
+
+def traced():
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def measure(path, file_type):
+    tracemalloc.start()
+    store = load_items(path, file_type, remember=False)  # synthetic layouts stay out of ~/.med_sync
+    load_peak = tracemalloc.get_traced_memory()[1]
+    with_store = traced()
+    items = store.to_items()
+    dicts_bytes = traced() - with_store
+    count = len(items)
+    del items
+    del store
+    store_bytes = with_store - traced()
+    tracemalloc.stop()
+    return count, store_bytes, dicts_bytes, load_peak
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [5000, 20000]
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            for file_type in ('marg', 'pmbi'):
+                path = os.path.join(tmp, f"{file_type}_{n}.xlsx")
+                write_synthetic(path, file_type, n)
+                count, store_bytes, dicts_bytes, load_peak = measure(path, file_type)
+                print(f"{file_type:5s} rows={count:7d}  store={store_bytes / 1e6:7.2f} MB  "
+                      f"dicts={dicts_bytes / 1e6:7.2f} MB  ({dicts_bytes / max(store_bytes, 1):.1f}x)  "
+                      f"load peak={load_peak / 1e6:7.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,11 @@ class SyncProvider extends ChangeNotifier {
   bool deleteFilesAfterSync = false;
   
   bool isSyncing = false;
+  bool _cancelRequested = false;
+  ExcelParser? _parser;
+
+  /// Latest progress update of the running parse: {stage, done, total, eta}
+  Map<String, dynamic>? progress;
   final List<String> _log = [];
   List<String> get log => List.unmodifiable(_log);
 
@@ -156,6 +161,18 @@ class SyncProvider extends ChangeNotifier {
      if (changed) notifyListeners();
   }
   
+  void cancelSync() {
+    if (!isSyncing || _cancelRequested) return;
+    _cancelRequested = true;
+    _parser?.cancel();
+    addLog('Cancelling sync...');
+  }
+
+  void _setProgress(Map<String, dynamic> update) {
+    progress = update;
+    notifyListeners();
+  }
+
   Future<void> refreshFiles() async {
       await _scanForFiles();
   }
@@ -170,6 +187,8 @@ class SyncProvider extends ChangeNotifier {
     }
 
     isSyncing = true;
+    _cancelRequested = false;
+    progress = null;
     notifyListeners();
     
     try {
@@ -183,24 +202,18 @@ class SyncProvider extends ChangeNotifier {
       final uploader = FirestoreUploader(tempFile.path);
       await uploader.init();
       
-      addLog('Clearing metadata collection...');
-      await uploader.cleanCollection('metadata', addLog);
-
       final parser = ExcelParser();
+      _parser = parser;
 
-      // Track files to delete
-      String? margFileToDelete;
-      String? pmbiFileToDelete;
+      // Parse both files before touching Firestore: a cancel leaves the live inventory as it was
+      List<Map<String, dynamic>>? margData;
+      List<Map<String, dynamic>>? pmbiData;
 
       if (margDetectedFile != null) {
            addLog("Processing Marg: $margDetectedFile");
            try {
-             final data = await parser.parseFile(margDetectedFile!, 'medicine_1_data', log: addLog);
-             if (data.isNotEmpty) {
-                await uploader.updateMetadata('medicine_1_data', data, addLog);
-                addLog('Successfully updated Marg data (${data.length} items).');
-                margFileToDelete = margDetectedFile;
-             } else {
+             margData = await parser.parseFile(margDetectedFile!, 'medicine_1_data', log: addLog, onProgress: _setProgress);
+             if (!_cancelRequested && margData.isEmpty) {
                 addLog('Marg file empty or parsing failed.');
              }
            } catch (e) {
@@ -208,15 +221,12 @@ class SyncProvider extends ChangeNotifier {
            }
       }
 
-      if (pmbiDetectedFile != null) {
+      // a cancel during the Marg parse stops the whole sync, PMBI is not started
+      if (pmbiDetectedFile != null && !_cancelRequested) {
            addLog("Processing PMBI: $pmbiDetectedFile");
            try {
-             final data = await parser.parseFile(pmbiDetectedFile!, 'medicine_2_data', log: addLog);
-             if (data.isNotEmpty) {
-                await uploader.updateMetadata('medicine_2_data', data, addLog);
-                addLog('Successfully updated PMBI data (${data.length} items).');
-                pmbiFileToDelete = pmbiDetectedFile;
-             } else {
+             pmbiData = await parser.parseFile(pmbiDetectedFile!, 'medicine_2_data', log: addLog, onProgress: _setProgress);
+             if (!_cancelRequested && pmbiData.isEmpty) {
                 addLog('PMBI file empty or parsing failed.');
              }
            } catch (e) {
@@ -224,6 +234,36 @@ class SyncProvider extends ChangeNotifier {
            }
       }
 
+      // Track files to delete
+      String? margFileToDelete;
+      String? pmbiFileToDelete;
+
+      if (_cancelRequested) {
+           addLog('Sync cancelled, metadata left unchanged.');
+      } else {
+           addLog('Clearing metadata collection...');
+           await uploader.cleanCollection('metadata', addLog);
+
+           if (margData != null && margData.isNotEmpty) {
+              try {
+                await uploader.updateMetadata('medicine_1_data', margData, addLog);
+                addLog('Successfully updated Marg data (${margData.length} items).');
+                margFileToDelete = margDetectedFile;
+              } catch (e) {
+                addLog("Error processing Marg: $e");
+              }
+           }
+           if (pmbiData != null && pmbiData.isNotEmpty) {
+              try {
+                await uploader.updateMetadata('medicine_2_data', pmbiData, addLog);
+                addLog('Successfully updated PMBI data (${pmbiData.length} items).');
+                pmbiFileToDelete = pmbiDetectedFile;
+              } catch (e) {
+                addLog("Error processing PMBI: $e");
+              }
+           }
+      }
+
       addLog('Sync process finished.');
       uploader.close();
       await tempFile.delete();
@@ -257,6 +297,9 @@ class SyncProvider extends ChangeNotifier {
       }
     } finally {
       isSyncing = false;
+      _cancelRequested = false;
+      _parser = null;
+      progress = null;
       notifyListeners();
     }
   }
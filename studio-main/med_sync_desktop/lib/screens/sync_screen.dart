@@ -100,6 +100,27 @@ class SyncScreen extends StatelessWidget {
             ),
             const SizedBox(height: 20),
 
+            // Progress of the running parse, with cancel
+            if (provider.isSyncing) ...[
+              Row(
+                children: [
+                  Expanded(
+                    child: LinearProgressIndicator(
+                      value: _progressValue(provider.progress),
+                    ),
+                  ),
+                  const SizedBox(width: 12),
+                  TextButton(
+                    onPressed: provider.cancelSync,
+                    child: const Text('Cancel'),
+                  ),
+                ],
+              ),
+              const SizedBox(height: 4),
+              Text(_progressText(provider.progress), style: const TextStyle(fontSize: 12)),
+              const SizedBox(height: 20),
+            ],
+
             // Log view
             Expanded(
               child: Container(
@@ -122,6 +143,22 @@ class SyncScreen extends StatelessWidget {
     );
   }
 
+  double? _progressValue(Map<String, dynamic>? update) {
+    final total = update?['total'] as int? ?? 0;
+    if (total <= 0) return null; // indeterminate
+    return (update!['done'] as int) / total;
+  }
+
+  String _progressText(Map<String, dynamic>? update) {
+    if (update == null) return 'Starting...';
+    final done = update['done'] as int;
+    final total = update['total'] as int;
+    final eta = update['eta'] as num?;
+    var text = total > 0 ? '${update['stage']}: $done / $total rows' : '${update['stage']}...';
+    if (eta != null && done < total) text += ', about ${eta.round()}s left';
+    return text;
+  }
+
   Widget _buildDirectorySection({
       required String title,
       required String? path,
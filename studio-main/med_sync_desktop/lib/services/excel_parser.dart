@@ -1,11 +1,49 @@
+import 'dart:async';
 import 'dart:io';
 import 'dart:convert';
 import 'package:flutter/foundation.dart';
 
 class ExcelParser {
-  
+  Process? _process;
+
+  /// How long a cancelled script gets to stop its sheet workers and exit.
+  static const cancelGrace = Duration(seconds: 5);
+
+  /// Stops the running parse. The script cancels on a "cancel" line on stdin
+  /// and exits within a second, sheet workers included. Process.kill() is
+  /// TerminateProcess on Windows: it skips that cleanup and only ends the
+  /// PyInstaller bootloader, so it is not used; a script that does not exit
+  /// within [cancelGrace] has its whole process tree killed instead.
+  Future<void> cancel() async {
+    final process = _process;
+    if (process == null) return;
+    try {
+      process.stdin.writeln('cancel');
+      await process.stdin.flush();
+    } catch (_) {
+      // already exited, stdin is closed
+    }
+    try {
+      await process.exitCode.timeout(cancelGrace);
+    } on TimeoutException {
+      _killTree(process);
+    }
+  }
+
+  static void _killTree(Process process) {
+    if (Platform.isWindows) {
+      Process.runSync('taskkill', ['/PID', '${process.pid}', '/T', '/F']);
+    } else {
+      process.kill();
+    }
+  }
+
   /// Reads an Excel/XLS file using Python bridge and returns a list of rows (as maps)
-  Future<List<Map<String, dynamic>>> parseFile(String path, String collectionName, {Function(String)? log}) async {
+  ///
+  /// [onProgress] receives the script's throttled progress updates:
+  /// {stage, done, total, eta} (eta in seconds, null while unknown).
+  Future<List<Map<String, dynamic>>> parseFile(String path, String collectionName,
+      {Function(String)? log, void Function(Map<String, dynamic>)? onProgress}) async {
     log?.call("Opening file via Python: $path");
     
     final fileType = collectionName.contains('medicine_1') ? 'marg' : 'pmbi';
@@ -57,12 +95,37 @@ class ExcelParser {
     }
 
     try {
-        ProcessResult result;
+        final Process process;
         if (useSystemPython) {
-            result = await Process.run('python', [scriptPath, path, fileType]);
+            process = await Process.start('python', [scriptPath, path, fileType]);
         } else {
-            result = await Process.run(scriptPath, [path, fileType]);
+            process = await Process.start(scriptPath, [path, fileType]);
         }
+        _process = process;
+        process.stdin.done.catchError((_) {}); // cancel() may write after the script exited
+
+        // stdout is the JSON items array; stderr carries log lines and
+        // {"progress": {...}} lines (one per update)
+        final stdoutText = process.stdout.transform(systemEncoding.decoder).join();
+        final stderrText = StringBuffer();
+        final stderrDone = process.stderr
+            .transform(systemEncoding.decoder)
+            .transform(const LineSplitter())
+            .forEach((line) {
+              if (line.startsWith('{"progress"')) {
+                try {
+                  final update = jsonDecode(line)['progress'];
+                  if (update is Map) onProgress?.call(Map<String, dynamic>.from(update));
+                  return;
+                } catch (_) {}
+              }
+              stderrText.writeln(line);
+            });
+        final exitCode = await process.exitCode;
+        final stdoutOutput = await stdoutText;
+        await stderrDone;
+        _process = null;
+        final result = ProcessResult(process.pid, exitCode, stdoutOutput, stderrText.toString());
         
         if (result.exitCode != 0) {
             log?.call("Python Error: ${result.stderr}");
@@ -86,6 +149,10 @@ class ExcelParser {
         }
         
         if (decoded is List) {
+             // quality summary, skipped sheets, snapshot path
+             for (final line in LineSplitter.split(result.stderr.toString())) {
+               if (line.trim().isNotEmpty) log?.call(line);
+             }
              return List<Map<String, dynamic>>.from(decoded);
         }
         
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+# Pipeline modules live next to the bundled process_excel.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "assets", "scripts"))
+
+# desk.py (Tk importer) shares them through its own sys.path entry
+DESK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "flut", "my_med_app", "python")
+sys.path.insert(0, DESK_DIR)
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "scale: time/memory curves against row count (test_scalability.py)")
+
+
+@pytest.fixture(autouse=True)
+def local_state(tmp_path, monkeypatch):
+    """Header profiles and snapshots go to the test's tmp_path, never to ~/.med_sync."""
+    monkeypatch.setenv("MED_SYNC_HEADER_PROFILES", str(tmp_path / "profiles.json"))
+    monkeypatch.setenv("MED_SYNC_SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+
@@ -0,0 +1,146 @@
+"""
+In-memory stand-in for the google-cloud-firestore client used by desk.py.
+
+Supports what the importer calls (collection().document().set(), batch()
+.set()/.commit()) and enforces Firestore's hard limits the same way the
+service does (InvalidArgument): 500 writes per batch and 1 MiB per document,
+with document sizes computed by Firestore's storage size rules. Like the
+real client, set() raises TypeError for a sentinel (SERVER_TIMESTAMP) inside
+an array. Every commit
+is recorded; latency and quota errors (ResourceExhausted) can be injected.
+"""
+import time
+from datetime import datetime
+
+from google.api_core import exceptions as gexc
+from google.cloud.firestore_v1.transforms import Sentinel
+
+MAX_BATCH_WRITES = 500
+MAX_DOC_BYTES = 1024 * 1024
+
+
+def _string_size(s):
+    return len(str(s).encode('utf-8')) + 1
+
+
+def value_size(value):
+    """Storage size of a field value (https://firebase.google.com/docs/firestore/storage-size)."""
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float, datetime)):
+        return 8
+    if isinstance(value, str):
+        return _string_size(value)
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(_string_size(k) + value_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(value_size(v) for v in value)
+    return 8  # sentinels (SERVER_TIMESTAMP, outside arrays) are stored as timestamps
+
+
+def check_encodable(value, in_array=False):
+    """Raise TypeError like the client does when encoding a sentinel inside an array."""
+    if isinstance(value, Sentinel):
+        if in_array:
+            raise TypeError('Cannot convert to a Firestore Value', value, 'Invalid type', type(value))
+    elif isinstance(value, dict):
+        for v in value.values():
+            check_encodable(v, in_array)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            check_encodable(v, True)
+
+
+def document_size(path, data):
+    name_size = sum(_string_size(part) for part in path.split('/')) + 16
+    return name_size + value_size(data) + 32
+
+
+class FakeDocument:
+    def __init__(self, db, path):
+        self._db = db
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+
+    def set(self, data):
+        check_encodable(data)
+        self._db._rpc()
+        self._db._check_size(self.path, data)
+        self._db.docs[self.path] = dict(data)
+
+
+class FakeCollection:
+    def __init__(self, db, name):
+        self._db = db
+        self.id = name
+
+    def document(self, doc_id):
+        return FakeDocument(self._db, f"{self.id}/{doc_id}")
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self._db = db
+        self._writes = []
+
+    def set(self, ref, data):
+        check_encodable(data)
+        self._writes.append((ref.path, dict(data)))
+
+    def commit(self):
+        db = self._db
+        db._rpc()
+        attempt = db.commit_attempts
+        db.commit_attempts += 1
+        if attempt in db.quota_errors:
+            raise gexc.ResourceExhausted(f"Quota exceeded (commit attempt {attempt})")
+        if len(self._writes) > MAX_BATCH_WRITES:
+            raise gexc.InvalidArgument(f"maximum {MAX_BATCH_WRITES} writes allowed per request")
+        sizes = [db._check_size(path, data) for path, data in self._writes]
+        for path, data in self._writes:
+            db.docs[path] = data
+        db.commits.append((len(self._writes), max(sizes, default=0)))
+        self._writes = []
+        return []
+
+
+class FakeFirestore:
+    """
+    latency: seconds slept per RPC (commit or single-document set).
+    quota_errors: commit attempt numbers (0-based) that fail with ResourceExhausted.
+    """
+
+    def __init__(self, latency=0.0, quota_errors=()):
+        self.latency = latency
+        self.quota_errors = set(quota_errors)
+        self.docs = {}  # document path -> data
+        self.commits = []  # (writes, largest document size) per successful commit
+        self.commit_attempts = 0
+        self.rpcs = 0
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def collections(self):
+        names = sorted({path.split('/', 1)[0] for path in self.docs})
+        return [FakeCollection(self, n) for n in names]
+
+    def documents(self, collection):
+        prefix = collection + '/'
+        return {p[len(prefix):]: d for p, d in self.docs.items() if p.startswith(prefix)}
+
+    def _rpc(self):
+        self.rpcs += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _check_size(self, path, data):
+        size = document_size(path, data)
+        if size > MAX_DOC_BYTES:
+            raise gexc.InvalidArgument(f"Document '{path}' is {size} bytes, over the {MAX_DOC_BYTES} byte limit")
+        return size
@@ -0,0 +1,43 @@
+"""
+Synthetic MARG/PMBI inventory for the tests and bench_records.py: rows as the
+importer reads them, and whole workbooks written with pandas.
+"""
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+
+def pmbi_rows(n, start=0):
+    """Rows as read from a PMBI stock report (one dict per row, header keys as exported)."""
+    return [{
+        "Drug Code": str(100000 + i),
+        "Drug Name": f"DRUG {i} CAP",
+        "UOM ": ("10's", "15's", "1 Bottle")[i % 3],
+        "Batch No": f"B{i % 2000:05d}",
+        "Expiry Date": f"{1 + i % 28:02d}/{1 + i % 12:02d}/2028",
+        "Qty": i % 300,
+        "MRP": round(2 + (i % 811) * 0.53, 2),
+    } for i in range(start, start + n)]
+
+
+def write_synthetic(path, file_type, n):
+    """Write an n-row MARG or PMBI export to path."""
+    base = datetime(2026, 1, 1)
+    if file_type == 'marg':
+        df = pd.DataFrame({
+            'Product Name': [f"PRODUCT {i} TAB 10S" for i in range(n)],
+            'Current Stock': [i % 500 for i in range(n)],
+            'M.R.P.': [round(5 + (i % 997) * 0.37, 2) for i in range(n)],
+            'EXP': [(base + timedelta(days=i % 900)).strftime('%d-%m-%Y') for i in range(n)],
+        })
+    else:
+        df = pd.DataFrame({
+            'Drug Code': [f"{100000 + i}" for i in range(n)],
+            'Drug Name': [f"DRUG {i} CAP" for i in range(n)],
+            'UOM': [("10's", "15's", "1 Bottle")[i % 3] for i in range(n)],
+            'Batch No': [f"B{i % 2000:05d}" for i in range(n)],
+            'Expiry Date': [(base + timedelta(days=i % 900)).strftime('%d-%m-%Y') for i in range(n)],
+            'Qty': [i % 300 for i in range(n)],
+            'MRP': [round(2 + (i % 811) * 0.53, 2) for i in range(n)],
+        })
+    df.to_excel(path, index=False)
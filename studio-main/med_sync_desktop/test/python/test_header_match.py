@@ -0,0 +1,150 @@
+import header_match
+from header_match import HeaderMatcher, ProfileStore, TARGETS, find_header_row, header_signature, resolve
+
+# Header rows of the exports we receive (see studio-main/xlsx)
+MARG_STOCK_81 = ['Code', 'Product Name', 'Unit', 'Current Stock', 'Sales Scheme', None, 'Purc.Scheme', None,
+                 'Cost Price', 'Value', 'M.R.P.', 'Purchase Price', 'Sales Price', 'Company', 'Manufacturer',
+                 'Rec.Date', 'Batch', 'MFG', 'EXP', 'Supplier', 'Inv.No', 'Inv.Date', 'Rack No.']
+MARG_STOCK_REPORT = ['Product Name', 'Current Stock', 'M.R.P.', 'EXP']
+MARG_ITEM_LIST = ['Item Description', 'Stock', 'Rate', 'Exp.Dt']
+MARG_KANNADA = ['Product Name', 'Product Name_kn', 'Current Stock', 'M.R.P.', 'EXP']
+PMBI_STOCK_REPORT = ['Drug Type', 'Drug Group', None, None, 'Drug Category', 'Hsn Code', 'Drug Code', 'Drug Name',
+                     'UOM ', 'Batch No', 'Expiry Date', 'Qty', 'MRP', None, None, None, 'Rate']
+PMBI_KANNADA = ['Drug Code', 'Drug Name', 'Drug Name_kan', 'UOM', 'Batch No', 'Expiry Date', 'Qty', 'MRP']
+PMBI_SHORT = ['Item Code', 'Item Description', 'Unit', 'Batch', 'Exp Date', 'Quantity', 'M.R.P']
+
+
+def named(headers, mapping):
+    return {field: headers[pos] for field, pos in mapping.items()}
+
+
+def match(file_type, headers):
+    return named(headers, HeaderMatcher(TARGETS[file_type]).match(headers))
+
+
+def test_marg_stock_81():
+    assert match('marg', MARG_STOCK_81) == {
+        'Product Name': 'Product Name',
+        'Current Stock': 'Current Stock',
+        'M.R.P.': 'M.R.P.',
+        'EXP': 'EXP',
+    }
+
+
+def test_marg_stock_report():
+    assert match('marg', MARG_STOCK_REPORT) == {h: h for h in MARG_STOCK_REPORT}
+
+
+def test_marg_variants():
+    assert match('marg', MARG_ITEM_LIST) == {
+        'Product Name': 'Item Description',
+        'Current Stock': 'Stock',
+        'M.R.P.': 'Rate',
+        'EXP': 'Exp.Dt',
+    }
+
+
+def test_marg_kannada_column_not_taken_by_name():
+    assert match('marg', MARG_KANNADA) == {
+        'Product Name': 'Product Name',
+        'Product Name_kn': 'Product Name_kn',
+        'Current Stock': 'Current Stock',
+        'M.R.P.': 'M.R.P.',
+        'EXP': 'EXP',
+    }
+
+
+def test_pmbi_stock_report():
+    assert match('pmbi', PMBI_STOCK_REPORT) == {
+        'Drug Name': 'Drug Name',
+        'Drug Code': 'Drug Code',
+        'MRP': 'MRP',
+        'Expiry Date': 'Expiry Date',
+        'Qty': 'Qty',
+        'UOM': 'UOM ',
+        'Batch No': 'Batch No',
+    }
+
+
+def test_pmbi_kannada():
+    mapping = match('pmbi', PMBI_KANNADA)
+    assert mapping['Drug Name'] == 'Drug Name'
+    assert mapping['Drug Name_kn'] == 'Drug Name_kan'
+
+
+def test_pmbi_variants():
+    assert match('pmbi', PMBI_SHORT) == {
+        'Drug Name': 'Item Description',
+        'Drug Code': 'Item Code',
+        'MRP': 'M.R.P',
+        'Expiry Date': 'Exp Date',
+        'Qty': 'Quantity',
+        'UOM': 'Unit',
+        'Batch No': 'Batch',
+    }
+
+
+def test_unrelated_headers_do_not_match():
+    assert match('marg', ['Supplier', 'Inv.No', 'Inv.Date', 'Rec.Date', 'MFG', 'Company']) == {}
+
+
+def test_fields_subset():
+    mapping, _, _ = resolve('pmbi', PMBI_KANNADA, fields={'Drug Name', 'MRP'})
+    assert named(PMBI_KANNADA, mapping) == {'Drug Name': 'Drug Name', 'MRP': 'MRP'}
+
+
+def test_signature_ignores_case_and_punctuation():
+    a = header_signature('marg', ['Product Name', 'M.R.P.', 'EXP', None])
+    b = header_signature('marg', ['product name ', 'MRP', 'exp'])
+    assert a == b
+    assert a != header_signature('pmbi', ['product name', 'MRP', 'exp'])
+    assert a != header_signature('marg', ['MRP', 'product name', 'exp'])
+
+
+def test_find_header_row_skips_preamble():
+    rows = [
+        ['PRADHANA MANTRI BHARATIYA JANAUSHADHI KENDRA'] + [None] * 16,
+        ['Stock Register Report(Drug Type-All List)'] + [None] * 16,
+        [None] * 17,
+        PMBI_STOCK_REPORT,
+        ['BPPI', 'Gastrointestinal (GIT)', None, None, 'ACUTE', '300490', '217', 'Ranitidine Tablets IP 150 mg'],
+    ]
+    idx, mapping, _, cached = find_header_row('pmbi', rows)
+    assert idx == 3
+    assert not cached
+    assert PMBI_STOCK_REPORT[mapping['Drug Name']] == 'Drug Name'
+
+
+def test_find_header_row_needs_the_name_field():
+    # A MARG export shares Code/Unit/Batch/M.R.P./EXP with PMBI but has no drug name
+    rows = [['STOCK REPORT AS ON DATE 16-12-2025'], MARG_STOCK_81]
+    assert find_header_row('pmbi', rows) is None
+    assert find_header_row('marg', rows)[0] == 1
+    assert find_header_row('pmbi', [PMBI_SHORT])[0] == 0
+    assert find_header_row('pmbi', [MARG_STOCK_81], fields={'MRP', 'Expiry Date'})[0] == 0
+
+
+def test_profile_store_remembers_layout(tmp_path, monkeypatch):
+    profiles = ProfileStore(str(tmp_path / 'profiles.json'))
+    mapping, signature, cached = resolve('marg', MARG_STOCK_81, profiles)
+    assert not cached
+    profiles.remember(signature, mapping)
+
+    # A fresh store reads the file; the known layout skips scoring entirely
+    def fail(*args, **kwargs):
+        raise AssertionError('matcher used for a remembered layout')
+    monkeypatch.setattr(header_match.HeaderMatcher, 'match', fail)
+    again, _, cached = resolve('marg', MARG_STOCK_81, ProfileStore(str(tmp_path / 'profiles.json')))
+    assert cached
+    assert again == mapping
+
+    rows = [['STOCK REPORT AS ON DATE 16-12-2025'], MARG_STOCK_81]
+    idx, found, _, cached = find_header_row('marg', rows, ProfileStore(str(tmp_path / 'profiles.json')))
+    assert (idx, found, cached) == (1, mapping, True)
+
+
+def test_profile_store_missing_or_corrupt_file(tmp_path):
+    assert ProfileStore(str(tmp_path / 'none.json')).get('x') is None
+    bad = tmp_path / 'bad.json'
+    bad.write_text('{not json')
+    assert ProfileStore(str(bad)).get('x') is None
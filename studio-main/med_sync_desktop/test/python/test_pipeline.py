@@ -0,0 +1,261 @@
+import json
+import shutil
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("firebase_admin")
+pytest.importorskip("tkinter")
+
+import desk
+import process_excel
+import snapshots
+from fake_firestore import FakeFirestore, MAX_DOC_BYTES, document_size
+from google.api_core import exceptions as gexc
+from sample_data import pmbi_rows
+
+SAMPLES_DIR = desk.os.path.join(desk.SCRIPTS_DIR, "..", "..", "..", "xlsx")
+
+
+@pytest.fixture(autouse=True)
+def no_commit_backoff(monkeypatch):
+    monkeypatch.setattr(desk, "COMMIT_BACKOFF", 0)
+
+
+# ---------------------------
+# parse_*
+# ---------------------------
+@pytest.mark.parametrize("value, expected", [
+    (5.63, 5.63), (7, 7.0), ("1,234.50", 1234.5), (" 12 ", 12.0),
+    ("", None), (None, None), (float("nan"), None), ("n/a", None),
+])
+def test_desk_parse_number(value, expected):
+    assert desk.parse_number(value) == expected
+
+
+@pytest.mark.parametrize("value, expected", [
+    (290, 290), (12.9, 12), ("1,200", 1200), ("3.0", 3), ("", None), (None, None), ("-", None),
+])
+def test_desk_parse_int(value, expected):
+    assert desk.parse_int(value) == expected
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("31/01/2028", datetime(2028, 1, 31)), ("31-01-2028", datetime(2028, 1, 31)),
+    ("2028-01-31", datetime(2028, 1, 31)), (datetime(2027, 5, 1), datetime(2027, 5, 1)),
+    ("", None), (None, None), ("  -   -", None),
+])
+def test_desk_parse_date(value, expected):
+    assert desk.parse_date(value) == expected
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("01-May-27", "01-05-27"), ("31-01-2028", "31-01-28"), ("2028-01-31 00:00:00", "31-01-28"),
+    ("31012028", "31-01-28"), ("  -   -", "-   -"), ("", None), (float("nan"), None),
+])
+def test_process_excel_parse_date(value, expected):
+    assert process_excel.parse_date(value) == expected
+
+
+# ---------------------------
+# upload_collection_strict
+# ---------------------------
+def test_upload_batches_within_limits():
+    db = FakeFirestore()
+    n = 2 * 400 + 123
+    up, sk, fl, store = desk.upload_collection_strict(db, "medicine-2", pmbi_rows(n), write_to_firestore=True)
+    assert (up, sk, fl) == (n, 0, 0)
+    assert [writes for writes, _ in db.commits] == [400, 400, 123]
+    docs = db.documents("medicine-2")
+    assert len(docs) == n
+    doc = docs["DRUG 7 CAP"]
+    assert doc["Drug Code"] == "100007" and doc["Qty"] == 7 and doc["Expiry Date"] == datetime(2028, 8, 8)
+    assert "id" not in doc and "_imported_at" in doc
+    assert max(size for _, size in db.commits) < MAX_DOC_BYTES
+
+
+def test_upload_retries_quota_errors():
+    db = FakeFirestore(quota_errors={1, 2})
+    up, _, fl, _ = desk.upload_collection_strict(db, "medicine-2", pmbi_rows(1000), write_to_firestore=True)
+    assert (up, fl) == (1000, 0)
+    assert db.commit_attempts == 5
+    assert [writes for writes, _ in db.commits] == [400, 400, 200]
+    assert len(db.documents("medicine-2")) == 1000
+
+
+def test_upload_stops_when_quota_stays_exhausted():
+    db = FakeFirestore(quota_errors=range(1, 100))
+    with pytest.raises(gexc.ResourceExhausted):
+        desk.upload_collection_strict(db, "medicine-2", pmbi_rows(1000), write_to_firestore=True)
+    assert db.commit_attempts == 1 + desk.COMMIT_RETRIES
+    assert len(db.documents("medicine-2")) == 400
+
+
+def test_upload_skips_rows_without_name():
+    rows = pmbi_rows(10)
+    rows[3]["Drug Name"] = None
+    skipped_rows = []
+    up, sk, _, store = desk.upload_collection_strict(FakeFirestore(), "medicine-2", rows, skipped_rows=skipped_rows)
+    assert (up, sk, len(store)) == (9, 1, 9)
+    assert len(skipped_rows) == 1
+
+
+@pytest.mark.parametrize("collection, row, name_field", [
+    ("medicine-1", {"Item Description": "DOLO 650", "Stock": 12, "Rate": 30.5, "Exp.Dt": "31/01/2028"},
+     "Product Name"),
+    ("medicine-2", {"Item Code": "100001", "Item Description": "DOLO 650", "Unit": "15's", "Batch": "B1",
+                    "Exp Date": "31/01/2028", "Quantity": 12, "M.R.P": 30.5}, "Drug Name"),
+])
+def test_upload_names_documents_from_mapped_header(collection, row, name_field):
+    db = FakeFirestore()
+    up, sk, _, store = desk.upload_collection_strict(db, collection, [row], write_to_firestore=True)
+    assert (up, sk) == (1, 0)
+    assert db.documents(collection)["DOLO 650"][name_field] == "DOLO 650"
+    assert store.item(0)["id"] == "DOLO 650"
+
+
+def test_snapshot_round_trip_of_desk_store(tmp_path):
+    if not snapshots.available():
+        pytest.skip("pyarrow not installed")
+    rows = pmbi_rows(5)
+    rows[1].update({"Drug Code": 217, "Batch No": 40012})  # numeric cells in a dtype=object frame
+    rows[2].update({"Qty": None, "UOM ": None, "MRP": "n/a"})
+    _, _, _, store = desk.upload_collection_strict(FakeFirestore(), "medicine-2", rows)
+    items = store.to_items()
+    assert items[1]["Drug Code"] == "217" and items[1]["Batch No"] == "40012"
+    assert items[2]["Qty"] is None and items[2]["UOM"] is None and items[2]["MRP"] == "n/a"
+    path = snapshots.write_snapshot(store, "pmbi", base_dir=str(tmp_path))
+    assert snapshots.to_store(snapshots.open_snapshot(path)).to_items() == items
+
+
+# ---------------------------
+# import_collection / metadata document
+# ---------------------------
+def test_metadata_document_fits_in_one_mib(tmp_path):
+    src = tmp_path / "StockReport.xlsx"
+    shutil.copy(desk.os.path.join(SAMPLES_DIR, "StockReport.xlsx"), src)
+    db = FakeFirestore()
+    desk.import_collection(db, "PMBI", str(src), "medicine-2", "pmbi", "medicine_2_data",
+                           desk.header_match.ProfileStore())
+    meta = db.docs["metadata/medicine_2_data"]
+    assert len(meta["items"]) == 613
+    assert "_imported_at" in meta and not any("_imported_at" in item for item in meta["items"])
+    size = document_size("metadata/medicine_2_data", meta)
+    # the whole inventory is one document; keep room for at least 4x today's items
+    assert size * 4 < MAX_DOC_BYTES, f"{size / len(meta['items']):.0f} bytes per item"
+
+
+def test_snapshot_failure_does_not_stop_the_import(tmp_path, monkeypatch, capsys):
+    def fail(*args, **kwargs):
+        raise ValueError("Formatter of 'Qty' cannot be saved in a snapshot")
+    monkeypatch.setattr(snapshots, "write_snapshot", fail)
+    src = tmp_path / "StockReport.xlsx"
+    shutil.copy(desk.os.path.join(SAMPLES_DIR, "StockReport.xlsx"), src)
+    db = FakeFirestore()
+    desk.import_collection(db, "PMBI", str(src), "medicine-2", "pmbi", "medicine_2_data",
+                           desk.header_match.ProfileStore())
+    assert len(db.docs["metadata/medicine_2_data"]["items"]) == 613
+    capsys.readouterr()  # desk.py log lines
+    process_excel.process_file(str(src), "pmbi")
+    out, err = capsys.readouterr()
+    assert len(json.loads(out)) == 613
+    assert "Could not write snapshot" in err
+
+
+def test_metadata_document_over_limit_is_rejected():
+    db = FakeFirestore()
+    _, _, _, store = desk.upload_collection_strict(db, "medicine-2", pmbi_rows(10000))
+    with pytest.raises(gexc.InvalidArgument):
+        db.collection("metadata").document("medicine_2_data").set({"items": store.to_items()})
+
+
+def test_server_timestamp_inside_items_is_rejected():
+    # what the client does when encoding the document, before any RPC
+    db, stamp = FakeFirestore(), desk.firestore.SERVER_TIMESTAMP
+    with pytest.raises(TypeError):
+        db.collection("metadata").document("medicine_2_data").set({"items": [{"_imported_at": stamp}]})
+    with pytest.raises(TypeError):
+        db.batch().set(db.collection("medicine-2").document("x"), {"batches": [stamp]})
+    assert db.rpcs == 0
+
+
+# ---------------------------
+# process_file
+# ---------------------------
+def write_pmbi_workbook(path, sheets):
+    with pd.ExcelWriter(path) as writer:
+        for name, rows in sheets.items():
+            pd.DataFrame(rows).to_excel(writer, sheet_name=name, index=False)
+
+
+def test_process_file_prints_items(tmp_path, capsys):
+    path = str(tmp_path / "stock.xlsx")
+    write_pmbi_workbook(path, {"Stock": pmbi_rows(50)})
+    process_excel.process_file(path, "pmbi")
+    out, err = capsys.readouterr()
+    items = json.loads(out)
+    assert len(items) == 50
+    assert items[0] == {"Drug Name": "DRUG 0 CAP", "Drug Code": "100000", "MRP": 2.0, "Expiry Date": "01-01-28",
+                        "Qty": "0", "UOM": "10's", "Batch No": "B00000", "_id": "100000"}
+    assert "quality: 50 rows" in err
+    assert json.load(open(tmp_path / "stock.quality.json"))["rows"] == 50
+
+
+def test_process_file_multi_store(tmp_path, capsys):
+    path = str(tmp_path / "branches.xlsx")
+    write_pmbi_workbook(path, {"Cover": [{"Report": "Consolidated stock"}],
+                               "Dharwad": pmbi_rows(30), "Hubli": pmbi_rows(20, start=30)})
+    process_excel.process_file(path, "pmbi")
+    items = json.loads(capsys.readouterr().out)
+    assert len(items) == 50
+    assert {i["store_id"] for i in items} == {"Dharwad", "Hubli"}
+    assert items[-1]["_id"] == "Hubli__100049"
+
+
+def test_process_file_keeps_colliding_store_ids_apart(tmp_path, capsys):
+    path = str(tmp_path / "branches.xlsx")
+    write_pmbi_workbook(path, {"Branch 1": pmbi_rows(3), "Branch (1)": pmbi_rows(3), "branch_1": pmbi_rows(3)})
+    process_excel.process_file(path, "pmbi")
+    out, err = capsys.readouterr()
+    items = json.loads(out)
+    assert [i["store_id"] for i in items[::3]] == ["Branch_1", "Branch_1_2", "branch_1_3"]
+    assert len({i["_id"] for i in items}) == 9
+    assert len(json.load(open(tmp_path / "branches.quality.json"))["stores"]) == 3
+
+
+def test_load_workbook_in_worker_processes(tmp_path):
+    path = str(tmp_path / "branches.xlsx")
+    write_pmbi_workbook(path, {"Dharwad": pmbi_rows(30), "Hubli": pmbi_rows(20, start=30)})
+    results = process_excel.load_workbook(path, "pmbi", workers=2)  # stores come back pickled
+    assert [len(r.store) for r in results] == [30, 20]
+    assert results[1].store.item(0)["Expiry Date"] == "03-07-28"
+
+
+def test_process_file_rejects_the_other_file_type(tmp_path, capsys):
+    path = str(tmp_path / "stock_81.xls")
+    shutil.copy(desk.os.path.join(SAMPLES_DIR, "stock_81.xls"), path)
+    process_excel.process_file(path, "pmbi")
+    assert json.loads(capsys.readouterr().out) == []
+    assert not (tmp_path / "profiles.json").exists()
+
+
+def test_process_file_reports_errors(tmp_path, capsys):
+    with pytest.raises(SystemExit):
+        process_excel.process_file(str(tmp_path / "missing.xlsx"), "pmbi")
+    assert "error" in json.loads(capsys.readouterr().out)
+
+
+def test_process_file_error_after_output_started_goes_to_stderr(tmp_path, capsys, monkeypatch):
+    path = str(tmp_path / "stock.xlsx")
+    write_pmbi_workbook(path, {"Stock": pmbi_rows(5)})
+
+    def cancelled_while_writing(stores, out=None, progress=None):
+        print("[", end="")
+        raise process_excel.progress_mod.Cancelled("import cancelled")
+    monkeypatch.setattr(process_excel, "write_items_json", cancelled_while_writing)
+    with pytest.raises(SystemExit):
+        process_excel.process_file(path, "pmbi")
+    out, err = capsys.readouterr()
+    assert out == "["
+    assert '{"error": "import cancelled"}' in err
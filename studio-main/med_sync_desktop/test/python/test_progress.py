@@ -0,0 +1,78 @@
+import io
+
+import pytest
+
+import progress
+from progress import Cancelled, Progress, format_update
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_updates_are_throttled():
+    clock, updates = FakeClock(), []
+    p = Progress(sink=updates.append, min_interval=0.5, clock=clock)
+    p.start('parse', 10000)
+    for _ in range(10):
+        clock.now += 0.125
+        p.advance(1000)
+    # stage start, then at most one update per 0.5 s
+    assert [u['done'] for u in updates] == [0, 4000, 8000]
+    p.finish()
+    p.finish()  # nothing new to report
+    assert [u['done'] for u in updates] == [0, 4000, 8000, 10000]
+    p.start('write', 10)
+    assert updates[-1] == {'stage': 'write', 'done': 0, 'total': 10, 'eta': None}
+
+
+def test_eta_excludes_time_before_first_rows():
+    clock, updates = FakeClock(), []
+    p = Progress(sink=updates.append, min_interval=0, clock=clock)
+    p.start('parse', 4000)
+    clock.now = 30.0  # reading the sheet
+    p.advance(1000)
+    clock.now = 31.0
+    p.advance(1000)
+    assert updates[-1]['eta'] == 2.0
+    assert format_update(updates[-1]) == 'parse: 2,000/4,000 rows (50%), ETA 2s'
+
+
+def test_cancel_stops_iterate_at_next_chunk():
+    p = Progress()
+    seen = []
+    with pytest.raises(Cancelled):
+        for i in p.iterate(range(10000), chunk=100):
+            seen.append(i)
+            if i == 250:
+                p.cancel()
+    assert len(seen) == 300
+    with pytest.raises(Cancelled):
+        p.start('write')
+
+
+def test_attached_progress_is_current():
+    p = Progress()
+    with progress.attached(p):
+        assert progress.current() is p
+    assert progress.current() is not p
+
+
+def test_cancel_line_on_stdin_cancels(monkeypatch):
+    interrupts = []
+    monkeypatch.setattr(progress._thread, 'interrupt_main', lambda: interrupts.append(True))
+    p = Progress()
+    progress.cancel_on_stdin(p, io.StringIO('status\ncancel\n')).join(timeout=5)
+    assert interrupts == [True]
+    with pytest.raises(Cancelled):
+        p.check()
+
+
+def test_end_of_stdin_does_not_cancel():
+    p = Progress()
+    progress.cancel_on_stdin(p, io.StringIO('')).join(timeout=5)
+    p.check()
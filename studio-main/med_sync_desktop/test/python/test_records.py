@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from records import RecordStore, FLOAT, INT, DATE, TEXT, INT_MISSING
+
+SCHEMA = {'Drug Name': TEXT, 'MRP': FLOAT, 'Qty': INT, 'Expiry Date': DATE}
+
+
+def test_items_round_trip():
+    store = RecordStore(SCHEMA, id_key='_id', constants={'store_id': 'Dharwad'})
+    store.append('217', {'Drug Name': 'Ranitidine 150', 'MRP': 5.63, 'Qty': 290, 'Expiry Date': datetime(2028, 1, 31)})
+    store.append('218', {'Drug Name': 'Paracetamol 500'}, raw={'Qty': 'n/a'}, replaced={'MRP': 'free'})
+    assert store.to_items() == [
+        {'Drug Name': 'Ranitidine 150', 'MRP': 5.63, 'Qty': 290, 'Expiry Date': datetime(2028, 1, 31),
+         'store_id': 'Dharwad', '_id': '217'},
+        {'Drug Name': 'Paracetamol 500', 'Qty': 'n/a', 'store_id': 'Dharwad', '_id': '218'},
+    ]
+    assert store.item(0, with_id=False) == {k: v for k, v in store.to_items()[0].items() if k != '_id'}
+    assert store.rejected_values('MRP') == {1: 'free'}
+    assert store.raw_values('Qty') == {1: 'n/a'}
+
+
+def test_columns_mark_missing_values():
+    store = RecordStore(SCHEMA)
+    store.append('a', {'MRP': 1.5, 'Qty': 3})
+    store.append('b', {})
+    assert np.isnan(store.column('MRP')[1])
+    assert list(store.column('Qty')) == [3, INT_MISSING]
+    assert list(store.column('Drug Name')) == [None, None]
+
+
+def test_formatters_apply_on_output_only():
+    store = RecordStore(SCHEMA, formatters={'Qty': str, 'Expiry Date': lambda d: d.strftime('%d-%m-%y')})
+    store.append('a', {'Qty': 7, 'Expiry Date': datetime(2027, 5, 1)})
+    assert store.item(0) == {'Qty': '7', 'Expiry Date': '01-05-27', 'id': 'a'}
+    assert store.column('Qty')[0] == 7
+
+
+@pytest.mark.parametrize('values, error', [
+    ({'Qty': 10 ** 19}, OverflowError),
+    ({'MRP': 'abc'}, ValueError),
+    ({'Expiry Date': '2028-01-31'}, TypeError),
+])
+def test_failed_append_leaves_store_aligned(values, error):
+    store = RecordStore(SCHEMA)
+    store.append('a', {'Drug Name': 'A', 'Qty': 1})
+    with pytest.raises(error):
+        store.append('b', dict({'Drug Name': 'B', 'MRP': 2.0}, **values))
+    store.append('c', {'Drug Name': 'C', 'Qty': 3})
+    assert [i['Drug Name'] for i in store.to_items()] == ['A', 'C']
+    assert all(len(store.column(f)) == len(store) == 2 for f in SCHEMA)
+
+
+def test_timezone_aware_dates_keep_their_calendar_date():
+    store = RecordStore(SCHEMA)
+    ist = timezone(timedelta(hours=5, minutes=30))
+    store.append('a', {'Expiry Date': datetime(2028, 1, 31, tzinfo=ist)})
+    assert store.item(0)['Expiry Date'] == datetime(2028, 1, 31)
+
+
+def test_from_columns_and_prefix_ids():
+    store = RecordStore.from_columns(SCHEMA, ['1', '2'], {'Qty': [4, INT_MISSING], 'Drug Name': ['A', None]},
+                                     raw={'MRP': {1: 'n/a'}})
+    store.prefix_ids('Hubli__')
+    assert store.to_items() == [{'Drug Name': 'A', 'Qty': 4, 'id': 'Hubli__1'}, {'MRP': 'n/a', 'id': 'Hubli__2'}]
+    with pytest.raises(ValueError):
+        RecordStore.from_columns(SCHEMA, ['1'], {'Qty': [1, 2]})
+
+
+def test_present_but_empty_cells_stay_out_of_the_raw_table():
+    store = RecordStore(SCHEMA)
+    store.append('a', {'Drug Name': 'A'}, raw={'Qty': None, 'MRP': 'n/a', 'Expiry Date': None})
+    store.append('b', {'Drug Name': 'B', 'Qty': 3})
+    assert store.item(0) == {'Drug Name': 'A', 'MRP': 'n/a', 'Qty': None, 'Expiry Date': None, 'id': 'a'}
+    assert store.item(1) == {'Drug Name': 'B', 'Qty': 3, 'id': 'b'}
+    assert store.raw_values('Qty') == {} and store.raw_values('MRP') == {0: 'n/a'}
+    assert store.empty_indices('Qty') == [0] and store.empty_indices('MRP') == []
+    assert store.rejected_values('Qty') == {}
+    copy = RecordStore.from_columns(SCHEMA, store.ids, {f: store.column(f) for f in SCHEMA},
+                                    raw={'MRP': store.raw_values('MRP')},
+                                    empty={f: store.empty_indices(f) for f in SCHEMA})
+    assert copy.to_items() == store.to_items()
@@ -0,0 +1,109 @@
+"""
+Time and memory of the import pipeline against row count.
+
+Each curve runs at SCALE_ROWS rows (today's exports are 600-1100 rows;
+MED_SYNC_SCALE_ROWS=6000,60000,110000 runs 10x-100x) and fails when
+throughput drops below a floor or time per row grows with the row count,
+which is how an accidental O(n^2) shows up. Floors are about 5x below what a
+single-core laptop does, so they catch regressions, not slow machines.
+pytest.ini deselects them (addopts -m "not scale"); run them with
+pytest -m scale -s (-s prints the curves).
+"""
+import gc
+import io
+import math
+import os
+import time
+import tracemalloc
+
+import pytest
+
+pytest.importorskip("firebase_admin")
+pytest.importorskip("tkinter")
+
+import desk
+import process_excel
+from fake_firestore import FakeFirestore, document_size, MAX_DOC_BYTES
+from sample_data import pmbi_rows, write_synthetic
+
+pytestmark = pytest.mark.scale
+
+SCALE_ROWS = [int(n) for n in os.environ.get("MED_SYNC_SCALE_ROWS", "1000,4000,16000").split(",")]
+UPLOAD_MIN_ROWS_PER_S = 4000
+PARSE_MIN_ROWS_PER_S = 600
+LINEARITY_SLACK = 2.5  # time per row at the largest size / at the smallest size
+MEM_MAX_BYTES_PER_ROW = 400  # pipeline allocations per parsed row; a dict per item alone is ~650
+BATCH_LIMIT = 400
+
+
+def check_curve(name, curve, min_rows_per_s):
+    """curve: [(rows, seconds)] in increasing rows."""
+    table = "\n".join(f"  {n:>8} rows  {t:8.3f} s  {n / t:10.0f} rows/s" for n, t in curve)
+    print(f"\n{name}\n{table}")
+    for n, t in curve:
+        assert n / t >= min_rows_per_s, f"{name}: {n / t:.0f} rows/s at {n} rows\n{table}"
+    (n0, t0), (n1, t1) = curve[0], curve[-1]
+    assert (t1 / n1) / (t0 / n0) <= LINEARITY_SLACK, f"{name}: time per row grows with row count\n{table}"
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def test_upload_time_curve():
+    curve = []
+    for n in SCALE_ROWS:
+        rows = pmbi_rows(n)
+        db = FakeFirestore()
+        seconds, (up, _, _, _) = timed(desk.upload_collection_strict, db, "medicine-2", rows, write_to_firestore=True)
+        assert up == n
+        assert all(writes <= BATCH_LIMIT for writes, _ in db.commits)
+        assert len(db.commits) == math.ceil(n / BATCH_LIMIT)
+        curve.append((n, seconds))
+    check_curve("upload_collection_strict (fake Firestore)", curve, UPLOAD_MIN_ROWS_PER_S)
+
+
+def test_parse_time_curve(tmp_path):
+    curve = []
+    for n in SCALE_ROWS:
+        path = str(tmp_path / f"pmbi_{n}.xlsx")
+        write_synthetic(path, "pmbi", n)
+        out = io.StringIO()
+        seconds, results = timed(process_excel.load_workbook, path, "pmbi")
+        write_seconds, _ = timed(process_excel.write_items_json, [r.store for r in results], out)
+        assert sum(len(r.store) for r in results) == n
+        curve.append((n, seconds + write_seconds))
+    check_curve("process_excel load + JSON", curve, PARSE_MIN_ROWS_PER_S)
+
+
+def test_latency_is_paid_per_batch_not_per_row():
+    n = SCALE_ROWS[-1]
+    db = FakeFirestore(latency=0.005)
+    seconds, _ = timed(desk.upload_collection_strict, db, "medicine-2", pmbi_rows(n), write_to_firestore=True)
+    assert db.rpcs == math.ceil(n / BATCH_LIMIT)
+    assert seconds >= db.rpcs * db.latency
+
+
+def test_memory_per_row_is_bounded():
+    for n in SCALE_ROWS:
+        rows = pmbi_rows(n)
+        gc.collect()
+        tracemalloc.start()
+        try:
+            _, _, _, store = desk.upload_collection_strict(FakeFirestore(), "medicine-2", rows)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert len(store) == n
+        assert peak / n <= MEM_MAX_BYTES_PER_ROW, f"{peak / n:.0f} bytes/row at {n} rows"
+
+
+def test_metadata_document_capacity():
+    """How many items fit in the single metadata document (1 MiB)."""
+    _, _, _, store = desk.upload_collection_strict(FakeFirestore(), "medicine-2", pmbi_rows(1000))
+    per_item = document_size("metadata/medicine_2_data", {"items": store.to_items()}) / len(store)
+    capacity = int(MAX_DOC_BYTES // per_item)
+    print(f"\nmetadata/medicine_2_data: {per_item:.0f} bytes per item, capacity {capacity} items")
+    assert capacity >= 4 * 1131, f"{per_item:.0f} bytes per item leaves room for {capacity} items"
@@ -0,0 +1,69 @@
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import process_excel
+import snapshots
+from records import RecordStore, FLOAT, INT, DATE, TEXT
+
+SCHEMA = {'Drug Name': TEXT, 'MRP': FLOAT, 'Qty': INT, 'Expiry Date': DATE}
+
+
+def make_store():
+    store = RecordStore(SCHEMA, id_key='_id')
+    store.append('217', {'Drug Name': 'Ranitidine 150', 'MRP': 5.63, 'Qty': 290, 'Expiry Date': datetime(2028, 1, 31)})
+    store.append('218', {'Drug Name': 'Paracetamol 500', 'Qty': 12}, raw={'MRP': 'n/a', 'Expiry Date': '  -   -'})
+    store.append('219', {'Drug Name': None, 'MRP': 0.5})
+    return store
+
+
+def test_round_trip(tmp_path):
+    store = make_store()
+    path = snapshots.write_snapshot(store, 'pmbi', source='StockReport.xlsx', base_dir=str(tmp_path))
+    table = snapshots.open_snapshot(path)
+    info = snapshots.snapshot_info(table)
+    assert info['kinds'] == SCHEMA
+    assert info['source'] == 'StockReport.xlsx'
+    assert table.num_rows == 3
+    assert snapshots.to_store(table).to_items() == store.to_items()
+
+
+def test_round_trip_keeps_constants_and_formatters(tmp_path):
+    store = process_excel.new_store(['Drug Name', 'MRP', 'Qty', 'Expiry Date'])
+    store.constants['store_id'] = 'Hubli'
+    store.append('217', {'Drug Name': 'Ranitidine 150', 'MRP': 5.63, 'Qty': 290, 'Expiry Date': datetime(2028, 1, 31)})
+    path = snapshots.write_snapshot(store, 'pmbi-Hubli', base_dir=str(tmp_path))
+    again = snapshots.to_store(snapshots.open_snapshot(path))
+    assert again.to_items() == store.to_items()
+    assert again.to_items()[0]['Qty'] == '290' and again.to_items()[0]['Expiry Date'] == '31-01-28'
+
+
+def test_deferred_constants_must_be_given_again(tmp_path):
+    server_timestamp = object()  # stands in for firestore.SERVER_TIMESTAMP
+    store = RecordStore(SCHEMA, constants={'store_id': 'Hubli', '_imported_at': server_timestamp})
+    store.append('217', {'Drug Name': 'Ranitidine 150'})
+    table = snapshots.open_snapshot(snapshots.write_snapshot(store, 'pmbi', base_dir=str(tmp_path)))
+    assert snapshots.snapshot_info(table)['deferred_constants'] == ['_imported_at']
+    with pytest.raises(ValueError, match='_imported_at'):
+        snapshots.to_store(table)
+    again = snapshots.to_store(table, constants={'_imported_at': server_timestamp})
+    assert again.to_items() == store.to_items()
+
+
+def test_unnamed_formatter_is_not_saved_silently(tmp_path):
+    store = RecordStore(SCHEMA, formatters={'Qty': lambda v: f"{v} units"})
+    with pytest.raises(ValueError, match='Qty'):
+        snapshots.write_snapshot(store, 'pmbi', base_dir=str(tmp_path))
+    assert snapshots.list_snapshots('pmbi', base_dir=str(tmp_path)) == []
+
+
+def test_versions_and_retention(tmp_path):
+    store = make_store()
+    for _ in range(4):
+        snapshots.write_snapshot(store, 'marg', base_dir=str(tmp_path), keep=2)
+    snaps = snapshots.list_snapshots('marg', base_dir=str(tmp_path))
+    assert [v for v, _ in snaps] == [3, 4]
+    assert snapshots.latest_snapshot('marg', base_dir=str(tmp_path)) == snaps[-1][1]
+    assert snapshots.list_snapshots('pmbi', base_dir=str(tmp_path)) == []